@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def sync_thumbnails(settings):
+    """Миниатюры считаются прямо в запросе: фоновый поток пережил бы
+    тест и писал бы во временный MEDIA_ROOT, который тест уже удалил."""
+    settings.THUMBNAILS_ASYNC = False
+
+
+@pytest.fixture(autouse=True)
+def raise_on_nplusone(settings):
+    """Найденный N+1 роняет тест, как и в manage.py test."""
+    settings.NPLUSONE_MODE = settings.NPLUSONE_TEST_MODE
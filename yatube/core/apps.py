@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import fragments, slow_queries, sqlite  # noqa: F401
+        connection_created.connect(slow_queries.install)
+        connection_created.connect(sqlite.configure)
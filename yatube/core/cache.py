@@ -0,0 +1,80 @@
+'''Кеш с защитой от «стада» (cache stampede).
+
+Значение хранится вместе с версией, временем вычисления и сроком
+годности. Пересчитывает его только тот процесс, который взял
+блокировку (`cache.add`), остальные в это время отдают старое значение.
+Чтобы горячие ключи не истекали у всех одновременно, срок годности
+проверяется с вероятностным опережением (XFetch): чем ближе истечение и
+чем дороже пересчёт, тем вероятнее ранний пересчёт одним процессом.
+'''
+import math
+import random
+import time
+
+from django.core.cache import cache as default_cache
+
+from . import metrics
+
+LOCK_TIMEOUT: int = 10
+# Сколько старое значение живёт после истечения: его отдают, пока
+# другой процесс пересчитывает ключ.
+STALE_TIMEOUT: int = 60 * 60
+WAIT_TIMEOUT: float = 2.0
+WAIT_STEP: float = 0.05
+BETA: float = 1.0
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _is_fresh(entry, version, beta):
+    value, entry_version, delta, expires_at = entry
+    if entry_version != version:
+        return False
+    if expires_at is None:
+        return True
+    jitter = delta * beta * math.log(random.random() or 1e-12)
+    return time.time() - jitter < expires_at
+
+
+def _build(key, build, timeout, version, cache):
+    started = time.time()
+    value = build()
+    delta = time.time() - started
+    expires_at = None if timeout is None else time.time() + timeout
+    physical_timeout = None if timeout is None else timeout + STALE_TIMEOUT
+    cache.set(key, (value, version, delta, expires_at), physical_timeout)
+    return value
+
+
+def get_or_build(key, build, timeout=None, version=None, beta=BETA,
+                 cache=default_cache):
+    '''Значение ключа; при промахе его вычисляет `build()`.
+
+    `timeout` — срок годности в секундах (None — пока не сменится
+    `version`). `version` — токен актуальности, например поколение
+    областей из posts.generations.
+    '''
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry, version, beta):
+        metrics.record_cache(hit=True)
+        return entry[0]
+    metrics.record_cache(hit=False)
+    lock_key = _lock_key(key)
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            return _build(key, build, timeout, version, cache)
+        finally:
+            cache.delete(lock_key)
+    if entry is not None:
+        return entry[0]
+    # Значения ещё нет совсем: ждём, пока его посчитает владелец
+    # блокировки, и только потом считаем сами.
+    deadline = time.time() + WAIT_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None and entry[1] == version:
+            return entry[0]
+    return _build(key, build, timeout, version, cache)
@@ -0,0 +1,13 @@
+'''Фрагменты страниц, общие для всего сайта (см. core.late_fragments).'''
+from django.template.loader import render_to_string
+
+from .late_fragments import register
+
+
+@register('header_user')
+def header_user(request):
+    '''Ссылки шапки для вошедшего пользователя или для гостя.'''
+    return render_to_string(
+        'includes/header_user.html',
+        {'request': request, 'user': request.user}
+    )
@@ -0,0 +1,60 @@
+'''Поздно подставляемые фрагменты страницы.
+
+Куски шаблона, которые зависят от пользователя (шапка со ссылками
+входа, кнопка подписки, форма комментария с CSRF-токеном), выводятся
+тегом {% late_fragment 'имя' аргументы %} как метка-комментарий.
+Остальная страница от пользователя не зависит и кешируется одна на всех
+(posts.page_cache), а LateFragmentsMiddleware уже после кеша подставляет
+на место меток фрагменты, отрисованные для текущего запроса, — как edge
+side includes в CDN. Фрагменты регистрируются через @register(имя).
+'''
+import re
+from urllib.parse import quote, unquote
+
+MARKER_PREFIX = b'<!--late '
+MARKER_RE = re.compile(rb'<!--late ([\w-]+)((?: [^ >]+)*)-->')
+
+_registry = {}
+
+
+def register(name):
+    '''Регистрирует функцию render(request, *args) -> str фрагмента.'''
+    def decorator(render):
+        _registry[name] = render
+        return render
+    return decorator
+
+
+def marker(name, *args):
+    '''Метка фрагмента `name` с аргументами-строками.'''
+    return '<!--late %s-->' % ' '.join(
+        [name, *(quote(str(arg), safe='') for arg in args)])
+
+
+def render(request, name, args):
+    '''Фрагмент `name` с аргументами `args` из метки (bytes) для
+    `request`. Метка незарегистрированного фрагмента остаётся как есть.'''
+    render_fragment = _registry.get(name.decode())
+    if render_fragment is None:
+        return MARKER_PREFIX + name + args + b'-->'
+    args = [unquote(arg) for arg in args.decode().split()]
+    return render_fragment(request, *args).encode()
+
+
+def split(content):
+    '''Делит `content` (bytes) на куски без меток и метки между ними.
+
+    Возвращает (куски, метки): метки — пары (имя, аргументы) для
+    render(), кусков на один больше, чем меток.
+    '''
+    parts = MARKER_RE.split(content)
+    return parts[::3], list(zip(parts[1::3], parts[2::3]))
+
+
+def fill(request, content):
+    '''Подставляет в `content` (bytes) фрагменты для `request`.
+    Метки незарегистрированных фрагментов остаются как есть.'''
+    return MARKER_RE.sub(
+        lambda match: render(request, match.group(1), match.group(2)),
+        content
+    )
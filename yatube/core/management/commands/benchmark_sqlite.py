@@ -0,0 +1,158 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sqlite import apply_pragmas
+
+# Настройки соединения, которые сравниваются: как Django открывает SQLite
+# без дополнительной настройки и с SQLITE_PRAGMAS.
+MODES = ('default', 'tuned')
+ROWS: int = 10000
+PAGE_SIZE: int = 10
+
+
+def prepare(path, rows, pragmas):
+    '''Таблица, похожая на posts_post, с `rows` строками.
+
+    journal_mode=WAL сохраняется в файле базы, поэтому включается здесь
+    один раз, как при первом соединении сервера.
+    '''
+    with sqlite3.connect(path) as db:
+        apply_pragmas(db.cursor(), pragmas)
+        db.execute(
+            'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+            'text TEXT, pub_date REAL)')
+        db.execute('CREATE INDEX post_author_idx ON post (author_id, id)')
+        db.execute('CREATE TABLE counter (key TEXT PRIMARY KEY, value INT)')
+        db.execute("INSERT INTO counter VALUES ('posts', ?)", [rows])
+        db.executemany(
+            'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)',
+            ((i % 100, 'текст поста ' * 10, time.time())
+             for i in range(rows))
+        )
+    sqlite3.connect(path).close()
+
+
+class Worker(threading.Thread):
+    '''Поток со своим соединением: читает страницы или пишет посты.'''
+
+    def __init__(self, path, pragmas, writer, deadline):
+        super().__init__(daemon=True)
+        self.path = path
+        self.pragmas = pragmas
+        self.writer = writer
+        self.deadline = deadline
+        self.done = 0
+        self.locked = 0
+        self.max_wait = 0.0
+
+    def run(self):
+        db = sqlite3.connect(self.path, isolation_level=None)
+        apply_pragmas(db.cursor(), self.pragmas)
+        rng = random.Random(self.ident)
+        step = self.write if self.writer else self.read
+        while time.perf_counter() < self.deadline:
+            started = time.perf_counter()
+            try:
+                step(db, rng)
+            except sqlite3.OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+                self.locked += 1
+                if db.in_transaction:
+                    db.execute('ROLLBACK')
+                continue
+            self.done += 1
+            self.max_wait = max(self.max_wait, time.perf_counter() - started)
+        db.close()
+
+    def read(self, db, rng):
+        # Как страница профиля: посты автора и их число.
+        author_id = rng.randrange(100)
+        db.execute(
+            'SELECT id, text, pub_date FROM post WHERE author_id = ? '
+            'ORDER BY id DESC LIMIT ?', [author_id, PAGE_SIZE]
+        ).fetchall()
+        db.execute("SELECT value FROM counter WHERE key = 'posts'").fetchone()
+
+    def write(self, db, rng):
+        # Как post_create: пост и счётчик в одной транзакции.
+        db.execute('BEGIN')
+        db.execute(
+            'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)',
+            [rng.randrange(100), 'новый пост', time.time()]
+        )
+        db.execute(
+            "UPDATE counter SET value = value + 1 WHERE key = 'posts'")
+        db.execute('COMMIT')
+
+
+def run_workload(path, pragmas, writers, readers, seconds):
+    '''Гоняет `writers` пишущих и `readers` читающих потоков `seconds`
+    секунд и возвращает итоги.'''
+    deadline = time.perf_counter() + seconds
+    workers = [
+        Worker(path, pragmas, writer, deadline)
+        for writer in [True] * writers + [False] * readers
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    write_workers = [worker for worker in workers if worker.writer]
+    read_workers = [worker for worker in workers if not worker.writer]
+    return {
+        'writes_per_s': round(
+            sum(worker.done for worker in write_workers) / seconds, 1),
+        'reads_per_s': round(
+            sum(worker.done for worker in read_workers) / seconds, 1),
+        'locked_errors': sum(worker.locked for worker in workers),
+        'max_write_ms': round(max(
+            (worker.max_wait for worker in write_workers), default=0
+        ) * 1000, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает конкурентные чтение и запись в SQLite с настройками '
+            'по умолчанию и с SQLITE_PRAGMAS на временной базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--writers', type=int, default=4,
+            help='Число пишущих потоков.'
+        )
+        parser.add_argument(
+            '--readers', type=int, default=8,
+            help='Число читающих потоков.'
+        )
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Сколько длится каждый замер.'
+        )
+        parser.add_argument(
+            '--rows', type=int, default=ROWS,
+            help='Сколько строк в таблице до начала замера.'
+        )
+
+    def handle(self, *args, **options):
+        if options['seconds'] <= 0:
+            raise CommandError('--seconds должно быть больше нуля.')
+        pragmas = {'default': {}, 'tuned': settings.SQLITE_PRAGMAS}
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in MODES:
+                path = os.path.join(directory, f'{mode}.sqlite3')
+                prepare(path, options['rows'], pragmas[mode])
+                result = run_workload(
+                    path, pragmas[mode], options['writers'],
+                    options['readers'], options['seconds']
+                )
+                self.stdout.write(self.style.MIGRATE_HEADING(mode))
+                for metric, value in result.items():
+                    self.stdout.write(f'  {metric}: {value}')
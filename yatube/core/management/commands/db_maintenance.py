@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.sqlite import INCREMENTAL_VACUUM_PAGES
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class Command(BaseCommand):
+    help = ('Обслуживание базы SQLite: обновляет статистику планировщика '
+            '(ANALYZE, PRAGMA optimize), возвращает свободные страницы '
+            '(incremental_vacuum) и сбрасывает журнал WAL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, default=INCREMENTAL_VACUUM_PAGES,
+            help='Сколько свободных страниц освободить за запуск.'
+        )
+        parser.add_argument(
+            '--enable-incremental-vacuum', action='store_true',
+            help='Перевести базу в режим auto_vacuum=INCREMENTAL. Нужен '
+                 'полный VACUUM: база блокируется на время перестройки.'
+        )
+
+    def pragma(self, cursor, statement):
+        cursor.execute(f'PRAGMA {statement}')
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда работает только с SQLite.')
+        with connection.cursor() as cursor:
+            free_before = self.pragma(cursor, 'freelist_count')
+            if options['enable_incremental_vacuum']:
+                self.pragma(cursor, 'auto_vacuum = INCREMENTAL')
+                self.stdout.write('VACUUM…')
+                cursor.execute('VACUUM')
+            self.stdout.write('ANALYZE…')
+            cursor.execute('ANALYZE')
+            self.pragma(cursor, 'optimize')
+            if self.pragma(cursor, 'auto_vacuum') == AUTO_VACUUM_INCREMENTAL:
+                cursor.execute(
+                    f"PRAGMA incremental_vacuum({options['pages']})")
+                cursor.fetchall()
+            elif free_before:
+                self.stdout.write(self.style.WARNING(
+                    f'Свободных страниц: {free_before}, но incremental '
+                    'vacuum выключен; запустите команду с '
+                    '--enable-incremental-vacuum.'
+                ))
+            if self.pragma(cursor, 'journal_mode') == 'wal':
+                cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                cursor.fetchall()
+            free_after = self.pragma(cursor, 'freelist_count')
+            pages = self.pragma(cursor, 'page_count')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: страниц {pages}, свободных было {free_before}, '
+            f'стало {free_after}.'
+        ))
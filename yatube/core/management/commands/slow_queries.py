@@ -0,0 +1,73 @@
+import json
+import os
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.slow_queries import normalize
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных SQL-запросов, сгруппированная по '
+            'форме запроса: сколько раз, суммарное и худшее время, '
+            'откуда вызван.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', default=settings.SLOW_QUERY_LOG,
+            help='Файл журнала; ротированные копии (.1, .2, …) читаются '
+                 'вместе с ним.'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько форм запросов показать.'
+        )
+
+    def read(self, path):
+        paths = [path] + [
+            f'{path}.{number}' for number in range(1, 100)
+            if os.path.exists(f'{path}.{number}')
+        ]
+        for name in paths:
+            if not os.path.exists(name):
+                continue
+            with open(name, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['log']):
+            raise CommandError(f"Журнал {options['log']} не найден.")
+        groups = defaultdict(lambda: {
+            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'views': Counter(), 'places': Counter(),
+        })
+        for entry in self.read(options['log']):
+            group = groups[normalize(entry['sql'])]
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            group['views'][entry.get('view') or '-'] += 1
+            place = entry.get('template') or (
+                entry['stack'][-1] if entry.get('stack') else '-')
+            group['places'][place] += 1
+        ranked = sorted(
+            groups.items(), key=lambda item: item[1]['total_ms'],
+            reverse=True
+        )
+        for shape, group in ranked[:options['limit']]:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{group['total_ms']:.1f} мс всего, {group['count']} раз, "
+                f"худший {group['max_ms']:.1f} мс"
+            ))
+            self.stdout.write(f'  {shape}')
+            for view, count in group['views'].most_common(3):
+                self.stdout.write(f'  view: {view} ({count})')
+            for place, count in group['places'].most_common(3):
+                self.stdout.write(f'  место: {place} ({count})')
+        if not groups:
+            self.stdout.write('Медленных запросов нет.')
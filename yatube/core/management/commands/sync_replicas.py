@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def copy_database(source, target):
+    '''Целостная копия базы SQLite через online backup API.'''
+    source_db = sqlite3.connect(source)
+    target_db = sqlite3.connect(target)
+    try:
+        source_db.backup(target_db)
+    finally:
+        target_db.close()
+        source_db.close()
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в реплики из SQLITE_REPLICAS. '
+            'С --interval повторяет копирование, изображая отставание '
+            'реплик.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Копировать каждые столько секунд, пока не прервут.'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не заданы: укажите SQLITE_REPLICAS.')
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('Команда работает только с SQLite.')
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                target = connections[alias].settings_dict['NAME']
+                copy_database(primary.settings_dict['NAME'], target)
+                self.stdout.write(f'{alias}: {target}')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,225 @@
+'''Метрики производительности запросов в памяти процесса.
+
+MetricsMiddleware собирает для каждого запроса к posts:*, users:* и
+about:* время ответа, число и время SQL-запросов, время рендера
+шаблона, попадания в кеш и размер ответа. Значения складываются в
+гистограммы с фиксированными корзинами: запись — несколько сложений под
+блокировкой, поэтому метрики можно не выключать под нагрузкой.
+Накопленное отдаётся в текстовом формате Prometheus по адресу /metrics.
+У каждого процесса свои гистограммы; Prometheus суммирует их сам.
+'''
+import bisect
+import threading
+import time
+
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (
+    1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Пространства имён URL, запросы к которым попадают в метрики.
+NAMESPACES = ('posts', 'users', 'about')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"').replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{%s}' % pairs
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    '''Гистограмма с корзинами «не больше», как в Prometheus.'''
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, label_names=('view',)):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Счётчики корзин, затем сумма и число наблюдений.
+                series = self._series[labels] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = {
+                labels: list(series)
+                for labels, series in self._series.items()
+            }
+        for labels, series in sorted(snapshot.items()):
+            labels = list(zip(self.label_names, labels))
+            cumulative = 0
+            bounds = [repr(float(bound)) for bound in self.buckets]
+            for bound, count in zip(bounds + ['+Inf'], series):
+                cumulative += count
+                yield (f'{self.name}_bucket',
+                       labels + [('le', bound)], cumulative)
+            yield f'{self.name}_sum', labels, series[-2]
+            yield f'{self.name}_count', labels, series[-1]
+
+
+class Counter:
+    '''Монотонный счётчик.'''
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, label_names=('view',)):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            yield self.name, list(zip(self.label_names, labels)), value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        '''Все метрики в текстовом формате Prometheus 0.0.4.'''
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(
+                    f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+request_duration = REGISTRY.register(Histogram(
+    'yatube_request_duration_seconds',
+    'Время ответа view.',
+    DURATION_BUCKETS
+))
+sql_queries = REGISTRY.register(Histogram(
+    'yatube_request_sql_queries',
+    'Число SQL-запросов за запрос.',
+    QUERY_BUCKETS
+))
+sql_duration = REGISTRY.register(Histogram(
+    'yatube_request_sql_duration_seconds',
+    'Суммарное время SQL-запросов за запрос.',
+    DURATION_BUCKETS
+))
+template_duration = REGISTRY.register(Histogram(
+    'yatube_request_template_duration_seconds',
+    'Время рендера шаблонов за запрос.',
+    DURATION_BUCKETS
+))
+response_size = REGISTRY.register(Histogram(
+    'yatube_response_size_bytes',
+    'Размер тела ответа.',
+    SIZE_BUCKETS
+))
+cache_requests = REGISTRY.register(Counter(
+    'yatube_cache_requests_total',
+    'Обращения к кешу по результату (hit/miss).',
+    ('view', 'result')
+))
+
+_local = threading.local()
+
+
+class RequestStats:
+    '''Счётчики текущего запроса.'''
+
+    __slots__ = (
+        'request', 'queries', 'sql_time', 'template_time', 'cache_hits',
+        'cache_misses')
+
+    def __init__(self, request=None):
+        self.request = request
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        '''Обёртка для connection.execute_wrapper.'''
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def start(request=None):
+    stats = _local.stats = RequestStats(request)
+    return stats
+
+
+def finish():
+    _local.stats = None
+
+
+def current():
+    return getattr(_local, 'stats', None)
+
+
+def record_template(duration):
+    stats = current()
+    if stats is not None:
+        stats.template_time += duration
+
+
+def record_cache(hit):
+    stats = current()
+    if stats is None:
+        return
+    if hit:
+        stats.cache_hits += 1
+    else:
+        stats.cache_misses += 1
+
+
+def observe(view, duration, stats, size):
+    '''Складывает итоги запроса в гистограммы.'''
+    request_duration.observe(duration, view)
+    sql_queries.observe(stats.queries, view)
+    sql_duration.observe(stats.sql_time, view)
+    template_duration.observe(stats.template_time, view)
+    if size is not None:
+        response_size.observe(size, view)
+    if stats.cache_hits:
+        cache_requests.inc(stats.cache_hits, view, 'hit')
+    if stats.cache_misses:
+        cache_requests.inc(stats.cache_misses, view, 'miss')
@@ -0,0 +1,104 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import late_fragments, metrics, nplusone, replicas
+
+
+class MetricsMiddleware:
+    '''Замеряет запросы к view из metrics.NAMESPACES (см. core.metrics).'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.start(request)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.finish()
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        if match is not None and match.namespace in metrics.NAMESPACES:
+            size = None
+            if not response.streaming:
+                size = len(response.content)
+            metrics.observe(match.view_name, duration, stats, size)
+        return response
+
+
+class NPlusOneMiddleware:
+    '''Ищет N+1 запросы в каждом запросе (см. core.nplusone).'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.NPLUSONE_MODE == 'off':
+            return self.get_response(request)
+        detector = nplusone.Detector(settings.NPLUSONE_THRESHOLD)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(detector))
+            response = self.get_response(request)
+        nplusone.report(detector, request)
+        return response
+
+
+class ReplicaMiddleware:
+    '''Направляет чтения view из replicas.READ_VIEWS в реплики и
+    закрепляет пользователя за основной базой после записи.'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.disable()
+        match = request.resolver_match
+        if (match is not None and match.view_name in replicas.WRITE_VIEWS
+                and response.status_code == 302):
+            response.set_cookie(
+                replicas.PIN_COOKIE, '1',
+                max_age=settings.PRIMARY_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.DATABASE_REPLICAS
+                and request.method in ('GET', 'HEAD')
+                and request.resolver_match.view_name in replicas.READ_VIEWS
+                and replicas.PIN_COOKIE not in request.COOKIES):
+            replicas.enable()
+
+
+class LateFragmentsMiddleware:
+    '''Подставляет в HTML-ответ фрагменты для текущего пользователя
+    (см. core.late_fragments).'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.streaming or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith(
+                    'text/html')):
+            return response
+        if late_fragments.MARKER_PREFIX not in response.content:
+            return response
+        response.content = late_fragments.fill(request, response.content)
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = str(len(response.content))
+        return response
@@ -0,0 +1,88 @@
+'''Поиск N+1 запросов.
+
+NPlusOneMiddleware считает, сколько раз за запрос выполнен SQL одной и
+той же формы. Форма, повторённая больше NPLUSONE_THRESHOLD раз, —
+признак N+1: обращение к связанному объекту в цикле по списку. Для неё
+запоминается строка шаблона и кода проекта, откуда пришёл повтор. В
+режиме 'warn' находка пишется в логгер yatube.nplusone, в режиме
+'raise' запрос падает с NPlusOneError, в режиме 'off' детектор
+выключен. По умолчанию режим 'warn', а в тестах — NPLUSONE_TEST_MODE
+('raise'): его включают core.test_runner и conftest.py.
+'''
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import tracing
+from .slow_queries import normalize
+
+logger = logging.getLogger('yatube.nplusone')
+
+# Управление транзакциями повторяется законно и формой не считается.
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT',
+                          'RELEASE')
+
+_local = threading.local()
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+@contextmanager
+def ignore():
+    '''Не считать запросы внутри блока: для чужого кода, который
+    повторяет запросы не по нашей вине.'''
+    _local.ignored = getattr(_local, 'ignored', 0) + 1
+    try:
+        yield
+    finally:
+        _local.ignored -= 1
+
+
+class Detector:
+    '''Счётчик форм SQL одного запроса.'''
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.locations = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'ignored', 0) or sql.startswith(
+                TRANSACTION_STATEMENTS):
+            return execute(sql, params, many, context)
+        # Django строит SQL с заглушками %s, поэтому одинаковые запросы
+        # с разными id дают одну и ту же строку.
+        self.counts[sql] += 1
+        if self.counts[sql] == self.threshold + 1:
+            self.locations[sql] = (
+                tracing.template_location(), tracing.project_stack(3))
+        return execute(sql, params, many, context)
+
+    def problems(self):
+        '''Сообщения о формах, повторённых больше порога.'''
+        messages = []
+        for sql, (template, stack) in self.locations.items():
+            message = 'N+1: запрос выполнен %d раз: %s' % (
+                self.counts[sql], normalize(sql))
+            if template:
+                message += '; шаблон %s' % template
+            if stack:
+                message += '; код %s' % ' → '.join(stack)
+            messages.append(message)
+        return messages
+
+
+def report(detector, request):
+    problems = detector.problems()
+    if not problems:
+        return
+    if settings.NPLUSONE_MODE == 'raise':
+        raise NPlusOneError(
+            '%s\n%s' % (request.get_full_path(), '\n'.join(problems)))
+    for problem in problems:
+        logger.warning('%s %s', request.get_full_path(), problem)
@@ -0,0 +1,65 @@
+'''Чтение из реплик базы с гарантией «читаю свои записи».
+
+ReplicaMiddleware отправляет в реплики чтения только у GET-запросов к
+READ_VIEWS; всё остальное, включая записи, идёт в основную базу.
+После успешной записи через WRITE_VIEWS (они отвечают редиректом)
+пользователь получает cookie PIN_COOKIE, и PRIMARY_PIN_SECONDS секунд
+все его чтения идут в основную базу, пока реплики догоняют её.
+'''
+import random
+import threading
+
+from django.conf import settings
+
+PIN_COOKIE = 'primary_pin'
+READ_VIEWS = frozenset((
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+))
+WRITE_VIEWS = frozenset((
+    'posts:post_create',
+    'posts:post_edit',
+    'posts:add_comment',
+    'posts:profile_follow',
+    'posts:profile_unfollow',
+    'users:signup',
+))
+# Сессии читаются из основной базы: иначе только что вошедший
+# пользователь может оказаться анонимом на отставшей реплике.
+PRIMARY_APPS = frozenset(('sessions',))
+
+_local = threading.local()
+
+
+def current():
+    '''Псевдоним реплики, из которой читает текущий поток, или None.'''
+    return getattr(_local, 'alias', None)
+
+
+def enable():
+    '''Чтения текущего потока идут в одну случайную реплику.'''
+    _local.alias = random.choice(settings.DATABASE_REPLICAS)
+
+
+def disable():
+    _local.alias = None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return 'default'
+        return current() or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,86 @@
+'''Журнал медленных SQL-запросов.
+
+Обёртка выполнения запросов (connection.execute_wrapper) ставится на
+каждое новое соединение с базой. Запрос дольше SLOW_QUERY_THRESHOLD_MS
+пишется в логгер yatube.slow_queries одной строкой JSON: SQL, параметры
+(при SLOW_QUERY_REDACT_PARAMS — скрытые), длительность, имя view,
+строка шаблона и последние кадры стека из кода проекта. Отчёт по
+журналу — `manage.py slow_queries`.
+'''
+import json
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics, tracing
+
+logger = logging.getLogger('yatube.slow_queries')
+
+REDACTED = '?'
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    '''Форма запроса: литералы и списки IN (...) заменены заглушками.'''
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _params(params, many):
+    if params is None:
+        return None
+    if settings.SLOW_QUERY_REDACT_PARAMS:
+        return REDACTED
+    if many:
+        return '<%d наборов>' % len(params)
+    if isinstance(params, dict):
+        return {key: str(value) for key, value in params.items()}
+    return [str(value) for value in params]
+
+
+def _view_name():
+    stats = metrics.current()
+    request = getattr(stats, 'request', None)
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else None
+
+
+def log_query(sql, params, many, duration):
+    logger.warning(json.dumps({
+        'time': timezone.now().isoformat(),
+        'duration_ms': round(duration * 1000, 2),
+        'view': _view_name(),
+        'template': tracing.template_location(),
+        'stack': tracing.project_stack(),
+        'sql': sql,
+        'params': _params(params, many),
+    }, ensure_ascii=False))
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    if threshold is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        if duration * 1000 >= threshold:
+            log_query(sql, params, many, duration)
+
+
+def install(sender, connection, **kwargs):
+    '''Обработчик connection_created.'''
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_wrapper)
@@ -0,0 +1,23 @@
+'''Настройка соединений с SQLite для работы под нагрузкой.'''
+from django.conf import settings
+
+# Сколько страниц освобождает за раз `manage.py db_maintenance`.
+INCREMENTAL_VACUUM_PAGES: int = 10000
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure(sender, connection, **kwargs):
+    '''Обработчик connection_created: SQLITE_PRAGMAS для SQLite.
+
+    Соединения с репликами открываются только на чтение.
+    '''
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
+        if connection.alias in settings.DATABASE_REPLICAS:
+            cursor.execute('PRAGMA query_only = 1')
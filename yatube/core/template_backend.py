@@ -0,0 +1,32 @@
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as backend
+
+from . import metrics
+
+
+class Template(backend.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.record_template(time.perf_counter() - started)
+
+
+class DjangoTemplates(backend.DjangoTemplates):
+    '''Стандартный бэкенд шаблонов, который засекает время рендера.
+
+    Замеряется только шаблон верхнего уровня: {% include %} и
+    {% extends %} рендерятся внутри него.
+    '''
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            backend.reraise(exc, self)
@@ -0,0 +1,14 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.late_fragments import marker
+
+register = template.Library()
+
+
+@register.simple_tag
+def late_fragment(name, *args):
+    '''Место фрагмента, который LateFragmentsMiddleware отрисует для
+    текущего пользователя: {% late_fragment 'follow_button' username %}.
+    '''
+    return mark_safe(marker(name, *args))
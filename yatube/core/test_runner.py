@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    '''Запуск тестов manage.py test: найденный N+1 роняет тест, режим
+    NPLUSONE_MODE берётся из NPLUSONE_TEST_MODE.'''
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._nplusone_mode = settings.NPLUSONE_MODE
+        settings.NPLUSONE_MODE = settings.NPLUSONE_TEST_MODE
+
+    def teardown_test_environment(self, **kwargs):
+        settings.NPLUSONE_MODE = self._nplusone_mode
+        super().teardown_test_environment(**kwargs)
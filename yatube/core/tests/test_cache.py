@@ -0,0 +1,33 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from core.cache import get_or_build
+
+
+class GetOrBuildTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.build = mock.Mock(side_effect=['первое', 'второе'])
+
+    def test_value_is_built_once_per_version(self):
+        """Значение пересчитывается только при смене версии."""
+        self.assertEqual(get_or_build('key', self.build, version=1), 'первое')
+        self.assertEqual(get_or_build('key', self.build, version=1), 'первое')
+        self.assertEqual(get_or_build('key', self.build, version=2), 'второе')
+        self.assertEqual(self.build.call_count, 2)
+
+    def test_stale_value_is_served_while_locked(self):
+        """Пока ключ пересчитывает другой процесс, отдаётся старое."""
+        get_or_build('key', self.build, version=1)
+        cache.add('key:lock', 1)
+        self.assertEqual(get_or_build('key', self.build, version=2), 'первое')
+        self.assertEqual(self.build.call_count, 1)
+
+    def test_expired_value_is_rebuilt(self):
+        with mock.patch('core.cache.time.time', return_value=1000):
+            get_or_build('key', self.build, timeout=10)
+        with mock.patch('core.cache.time.time', return_value=1011):
+            self.assertEqual(
+                get_or_build('key', self.build, timeout=10), 'второе')
@@ -0,0 +1,36 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from core import late_fragments
+from core.middleware import LateFragmentsMiddleware
+
+
+@late_fragments.register('test_greeting')
+def greeting(request, name, place):
+    return f'<b>{name} из {place}</b>'
+
+
+class LateFragmentsTest(SimpleTestCase):
+    def test_marker_is_filled_with_arguments(self):
+        """Аргументы с пробелами и спецсимволами доходят до фрагмента."""
+        content = (
+            'до ' + late_fragments.marker('test_greeting', 'Лев', 'Ясной -->')
+            + ' после'
+        ).encode()
+        self.assertEqual(
+            late_fragments.fill(None, content).decode(),
+            'до <b>Лев из Ясной --></b> после'
+        )
+
+    def test_unknown_fragment_is_left_as_is(self):
+        content = late_fragments.marker('missing').encode()
+        self.assertEqual(late_fragments.fill(None, content), content)
+
+    def test_middleware_fills_only_html(self):
+        content = late_fragments.marker('test_greeting', 'a', 'b')
+        html = LateFragmentsMiddleware(lambda request: HttpResponse(content))
+        text = LateFragmentsMiddleware(lambda request: HttpResponse(
+            content, content_type='text/plain'))
+        request = RequestFactory().get('/')
+        self.assertEqual(html(request).content, '<b>a из b</b>'.encode())
+        self.assertEqual(text(request).content, content.encode())
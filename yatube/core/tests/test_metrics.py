@@ -0,0 +1,99 @@
+import threading
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core import metrics
+
+
+def sample(name, **labels):
+    """Значение строки метрики из вывода /metrics или None."""
+    prefix = name + metrics._format_labels(labels.items()) + ' '
+    for line in metrics.REGISTRY.render().splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return None
+
+
+class HistogramTest(TestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test_seconds', 'Тест', (0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'view')
+        samples = {
+            (name, tuple(labels)): value
+            for name, labels, value in histogram.samples()
+        }
+        view = ('view', 'view')
+        for bound, count in (('0.1', 2), ('1.0', 3), ('+Inf', 4)):
+            self.assertEqual(
+                samples['test_seconds_bucket', (view, ('le', bound))], count)
+        self.assertEqual(samples['test_seconds_count', (view,)], 4)
+        self.assertAlmostEqual(samples['test_seconds_sum', (view,)], 3.65)
+
+    def test_observations_from_threads_are_not_lost(self):
+        histogram = metrics.Histogram('test_seconds', 'Тест', (1.0,))
+
+        def work():
+            for _ in range(1000):
+                histogram.observe(0.5, 'view')
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counts = [
+            value for name, labels, value in histogram.samples()
+            if name == 'test_seconds_count'
+        ]
+        self.assertEqual(counts, [8000])
+
+
+class MetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_view_requests_are_recorded(self):
+        before = sample(
+            'yatube_request_duration_seconds_count', view='posts:index') or 0
+        misses = sample(
+            'yatube_cache_requests_total', view='posts:index',
+            result='miss') or 0
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(sample(
+            'yatube_request_duration_seconds_count', view='posts:index'),
+            before + 2)
+        self.assertGreater(sample(
+            'yatube_request_sql_queries_sum', view='posts:index'), 0)
+        self.assertGreater(sample(
+            'yatube_request_template_duration_seconds_sum',
+            view='posts:index'), 0)
+        self.assertGreater(sample(
+            'yatube_response_size_bytes_sum', view='posts:index'), 0)
+        self.assertGreater(sample(
+            'yatube_cache_requests_total', view='posts:index',
+            result='miss'), misses)
+        self.assertIsNotNone(sample(
+            'yatube_cache_requests_total', view='posts:index',
+            result='hit'))
+
+    def test_other_routes_are_not_recorded(self):
+        self.client.get(reverse('metrics'))
+        self.assertIsNone(sample(
+            'yatube_request_duration_seconds_count', view='metrics'))
+
+    def test_metrics_endpoint(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertContains(
+            response, '# TYPE yatube_request_duration_seconds histogram')
+
+    def test_metrics_endpoint_is_closed_to_other_hosts(self):
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='192.0.2.1')
+        self.assertEqual(response.status_code, 403)
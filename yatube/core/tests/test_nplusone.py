@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+
+from core import nplusone
+from core.middleware import NPlusOneMiddleware
+from posts.models import Post
+
+User = get_user_model()
+
+FEED = Template(
+    '{% for post in posts %}\n{{ post.author.username }}\n{% endfor %}')
+
+
+@override_settings(NPLUSONE_THRESHOLD=3)
+class NPlusOneTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for i in range(5):
+            author = User.objects.create_user(username=f'author_{i}')
+            Post.objects.create(author=author, text='Пост')
+
+    def get(self, posts):
+        def view(request):
+            return HttpResponse(FEED.render(Context({'posts': posts})))
+
+        middleware = NPlusOneMiddleware(view)
+        return middleware(RequestFactory().get('/feed/'))
+
+    def test_tests_run_in_raise_mode(self):
+        """N+1 в любом тесте роняет его, без override_settings."""
+        with self.assertRaises(nplusone.NPlusOneError):
+            self.get(Post.objects.all())
+
+    @override_settings(NPLUSONE_MODE='raise')
+    def test_repeated_query_raises_with_template_line(self):
+        with self.assertRaisesMessage(
+                nplusone.NPlusOneError, 'шаблон <unknown source>:2'):
+            self.get(Post.objects.all())
+
+    @override_settings(NPLUSONE_MODE='warn')
+    def test_warn_mode_logs(self):
+        with self.assertLogs('yatube.nplusone') as logs:
+            response = self.get(Post.objects.all())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('запрос выполнен 5 раз', logs.output[0])
+        self.assertIn('auth_user', logs.output[0])
+
+    @override_settings(NPLUSONE_MODE='raise')
+    def test_joined_query_passes(self):
+        response = self.get(Post.objects.select_related('author'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(NPLUSONE_MODE='raise')
+    def test_ignored_block_is_not_counted(self):
+        def view(request):
+            with nplusone.ignore():
+                content = FEED.render(Context({'posts': Post.objects.all()}))
+            return HttpResponse(content)
+
+        response = NPlusOneMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from core import replicas
+from core.middleware import ReplicaMiddleware
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTest(TestCase):
+    def tearDown(self):
+        replicas.disable()
+
+    def test_reads_go_to_replica_only_when_enabled(self):
+        """Чтения идут в реплику только после enable()."""
+        router = replicas.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), 'default')
+        replicas.enable()
+        self.assertEqual(router.db_for_read(Post), 'replica1')
+        self.assertEqual(router.db_for_read(Session), 'default')
+        self.assertEqual(router.db_for_write(Post), 'default')
+
+    def test_migrations_skip_replicas(self):
+        router = replicas.ReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
+
+    def alias_in_view(self, path, **cookies):
+        seen = []
+
+        def view(request):
+            request.resolver_match = resolve(request.path_info)
+            middleware.process_view(request, None, (), {})
+            seen.append(replicas.current())
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+        request = RequestFactory().get(path)
+        request.COOKIES.update(cookies)
+        middleware(request)
+        self.assertIsNone(replicas.current())
+        return seen[0]
+
+    def test_middleware_routes_read_views(self):
+        """Ленты читаются из реплики, закреплённый пользователь и
+        прочие view — из основной базы."""
+        self.assertEqual(
+            self.alias_in_view(reverse('posts:index')), 'replica1')
+        self.assertIsNone(self.alias_in_view(
+            reverse('posts:index'), **{replicas.PIN_COOKIE: '1'}))
+        self.assertIsNone(self.alias_in_view(reverse('posts:search')))
+
+
+class PrimaryPinTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_write_pins_reader_to_primary(self):
+        """После записи ставится cookie закрепления за основной базой."""
+        for response in (
+            self.client.post(
+                reverse('posts:add_comment', args=(self.post.pk,)),
+                {'text': 'Комментарий'}
+            ),
+            self.client.get(
+                reverse('posts:profile_follow', args=('author',))),
+        ):
+            cookie = response.cookies[replicas.PIN_COOKIE]
+            self.assertEqual(cookie['max-age'], 10)
+
+    def test_form_page_does_not_pin(self):
+        response = self.client.get(reverse('posts:post_create'))
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.slow_queries import normalize
+
+User = get_user_model()
+
+
+class SlowQueryLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def entries(self, logs):
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_entry_names_view_and_project_line(self):
+        with self.assertLogs('yatube.slow_queries') as logs:
+            Client().get(
+                reverse('posts:profile', kwargs={'username': 'auth'}))
+        entry = next(
+            entry for entry in self.entries(logs)
+            if 'auth_user' in entry['sql'] and 'username' in entry['sql']
+        )
+        self.assertEqual(entry['view'], 'posts:profile')
+        self.assertEqual(entry['params'], '?')
+        self.assertTrue(
+            entry['stack'][-1].startswith('posts/views.py:'), entry['stack'])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_entry_names_template_line(self):
+        template = Template(
+            '{% for user in users %}\n{{ user.username }}{% endfor %}')
+        with self.assertLogs('yatube.slow_queries') as logs:
+            template.render(Context({'users': User.objects.all()}))
+        self.assertTrue(
+            self.entries(logs)[0]['template'].endswith(':1'))
+
+    @override_settings(
+        SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_REDACT_PARAMS=False)
+    def test_params_can_be_logged(self):
+        with self.assertLogs('yatube.slow_queries') as logs:
+            User.objects.filter(username='auth').exists()
+        self.assertEqual(self.entries(logs)[0]['params'][0], 'auth')
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=None)
+    def test_log_can_be_turned_off(self):
+        with mock.patch('core.slow_queries.log_query') as log_query:
+            User.objects.filter(username='auth').exists()
+        log_query.assert_not_called()
+
+
+class SlowQueriesReportTest(TestCase):
+    def test_normalize_groups_literals_and_in_lists(self):
+        self.assertEqual(
+            normalize('SELECT  * FROM t WHERE id IN (%s, %s, %s) '
+                      "AND name = 'x' LIMIT 21"),
+            normalize('SELECT * FROM t WHERE id IN (%s) '
+                      "AND name = 'y' LIMIT 10"),
+        )
+
+    def test_report_groups_by_shape(self):
+        entries = [
+            {'sql': 'SELECT * FROM t WHERE id = %s', 'duration_ms': 150,
+             'view': 'posts:index', 'template': None,
+             'stack': ['posts/views.py:15 in index']},
+            {'sql': 'SELECT * FROM t WHERE id = %s', 'duration_ms': 250,
+             'view': 'posts:index', 'template': None,
+             'stack': ['posts/views.py:15 in index']},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slow.log')
+            with open(path, 'w', encoding='utf-8') as file:
+                for entry in entries:
+                    file.write(json.dumps(entry) + '\n')
+            out = StringIO()
+            call_command('slow_queries', log=path, stdout=out)
+        report = out.getvalue()
+        self.assertIn('400.0 мс всего, 2 раз, худший 250.0 мс', report)
+        self.assertIn('SELECT * FROM t WHERE id = ?', report)
+        self.assertIn('posts/views.py:15 in index (2)', report)
@@ -0,0 +1,37 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+
+class SQLiteTuningTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_gets_pragmas(self):
+        """Новое соединение получает SQLITE_PRAGMAS."""
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        # 1 — synchronous=NORMAL.
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+    def test_db_maintenance(self):
+        """db_maintenance обновляет статистику и сообщает о страницах."""
+        out = StringIO()
+        call_command('db_maintenance', stdout=out)
+        self.assertIn('Готово', out.getvalue())
+
+    def test_benchmark_sqlite(self):
+        """benchmark_sqlite печатает итоги обоих режимов."""
+        out = StringIO()
+        call_command(
+            'benchmark_sqlite', seconds=0.2, rows=100, writers=1, readers=1,
+            stdout=out
+        )
+        output = out.getvalue()
+        self.assertIn('tuned', output)
+        self.assertIn('writes_per_s', output)
+        self.assertIn('locked_errors: 0', output)
@@ -0,0 +1,58 @@
+'''Где в коде проекта или в шаблоне возник SQL-запрос.'''
+import os
+import sys
+
+from django.conf import settings
+
+PROJECT_DIR = os.path.abspath(settings.BASE_DIR) + os.sep
+# Модули, которые сами разбирают стек, в нём не показываются.
+SKIPPED_FILES = (
+    os.path.join(PROJECT_DIR, 'core', 'tracing.py'),
+    os.path.join(PROJECT_DIR, 'core', 'slow_queries.py'),
+    os.path.join(PROJECT_DIR, 'core', 'nplusone.py'),
+    os.path.join(PROJECT_DIR, 'core', 'middleware.py'),
+    os.path.join(PROJECT_DIR, 'core', 'metrics.py'),
+)
+STACK_LIMIT: int = 5
+
+
+def _is_project_frame(filename):
+    return (
+        filename.startswith(PROJECT_DIR)
+        and filename not in SKIPPED_FILES
+        and os.sep + 'site-packages' + os.sep not in filename
+    )
+
+
+def project_stack(limit=STACK_LIMIT, frame=None):
+    '''Последние `limit` кадров стека из кода проекта, внешний первым:
+    ['posts/views.py:42 in profile', ...].'''
+    frame = frame or sys._getframe(1)
+    lines = []
+    while frame is not None and len(lines) < limit:
+        filename = frame.f_code.co_filename
+        if _is_project_frame(filename):
+            lines.append('%s:%s in %s' % (
+                os.path.relpath(filename, PROJECT_DIR),
+                frame.f_lineno,
+                frame.f_code.co_name
+            ))
+        frame = frame.f_back
+    lines.reverse()
+    return lines
+
+
+def template_location(frame=None):
+    '''«posts/profile.html:12» — тег шаблона, который сейчас рендерится,
+    или None, если запрос выполнен не из шаблона.'''
+    frame = frame or sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                name = origin.template_name or origin.name
+                return '%s:%s' % (name, token.lineno)
+        frame = frame.f_back
+    return None
@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 
+from . import metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -7,3 +11,13 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics_view(request):
+    '''Метрики процесса в текстовом формате Prometheus.'''
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.REGISTRY.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -1,9 +1,77 @@
-from django.contrib import admin
+import hashlib
 
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from core.cache import get_or_build
+
+from . import counters, generations, search
 from .models import Post, Group, Comment, Follow
 
+# Дальше этого числа строк фильтрованный список считается по кешу.
+COUNT_LIMIT: int = 10000
+# Сколько секунд живёт закешированное число строк списка.
+COUNT_TIMEOUT: int = 60
+
+
+class EstimatedCountPaginator(Paginator):
+    '''Paginator админки без полного COUNT(*) на каждой странице.
+
+    Число строк всей таблицы берётся из кеша и пересчитывается не чаще
+    раза в COUNT_TIMEOUT секунд. Фильтрованный список считается не
+    дальше COUNT_LIMIT строк; если их больше, точное число (чтобы были
+    видны все страницы) тоже берётся из кеша, пока листают тот же
+    фильтр.
+    '''
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        key = f'admin:count:{queryset.model._meta.label_lower}'
+        if not queryset.query.where:
+            return get_or_build(key, queryset.count, COUNT_TIMEOUT)
+        count = queryset[:COUNT_LIMIT].count()
+        if count < COUNT_LIMIT:
+            return count
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+        return get_or_build(f'{key}:{digest}', queryset.count, COUNT_TIMEOUT)
+
+
+class IndexedSearchMixin:
+    '''Поиск в админке по поисковому индексу вместо LIKE '%…%'.'''
+    search_fields = ('text',)
+
+    def get_search_results(self, request, queryset, search_term):
+        terms = search.parse_query(search_term)
+        if not terms:
+            return queryset, False
+        return queryset.filter(pk__in=self.matching_ids(terms)), False
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    '''Общие настройки списков с большим числом строк.'''
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+
+class PostActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        required=False,
+        label='Группа',
+        empty_label='без группы'
+    )
+
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(IndexedSearchMixin, ScalableAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,13 +79,72 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
-    search_fields = ('text',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
+    # Оба фильтра по дате — диапазоны по индексированному pub_date.
     list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    date_hierarchy = 'pub_date'
+    action_form = PostActionForm
+    actions = ('move_to_group',)
+
+    def matching_ids(self, terms):
+        return search.matching_post_ids(terms)
+
+    def move_to_group(self, request, queryset):
+        '''Переносит выбранные посты в группу одним UPDATE.
+
+        Сигналы при этом не срабатывают, поэтому счётчики групп и
+        поколения кеша обновляются здесь же.
+        '''
+        group_id = request.POST.get('group') or None
+        group = Group.objects.filter(pk=group_id).first()
+        if group_id and group is None:
+            self.message_user(
+                request, 'Группа не найдена.', messages.ERROR)
+            return
+        queryset = queryset.order_by()
+        with transaction.atomic():
+            moved = list(queryset.exclude(group=group).values(
+                'group_id', 'group__slug'
+            ).annotate(count=Count('pk')))
+            usernames = set(queryset.values_list(
+                'author__username', flat=True).distinct())
+            post_ids = list(queryset.values_list('pk', flat=True))
+            updated = queryset.update(group=group, updated_at=timezone.now())
+            total = 0
+            scopes = [generations.INDEX]
+            for row in moved:
+                total += row['count']
+                if row['group_id']:
+                    counters.change(
+                        counters.group_posts_key(row['group_id']),
+                        -row['count']
+                    )
+                    scopes.append(
+                        generations.group_scope(row['group__slug']))
+            if group is not None:
+                counters.change(counters.group_posts_key(group.pk), total)
+                scopes.append(generations.group_scope(group.slug))
+            scopes.extend(map(generations.author_scope, usernames))
+        generations.bump(*scopes)
+        generations.bump_posts(post_ids)
+        self.message_user(request, f'Перенесено постов: {updated}.')
+
+    move_to_group.short_description = 'Перенести в группу'
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'title',
+        'slug',
+    )
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(IndexedSearchMixin, ScalableAdmin):
     list_display = (
         'pk',
         'post',
@@ -25,22 +152,28 @@ class CommentAdmin(admin.ModelAdmin):
         'text',
         'created',
     )
-    search_fields = ('text',)
+    list_select_related = ('post', 'author')
+    raw_id_fields = ('post', 'author')
     list_filter = ('created',)
-    empty_value_display = '-пусто-'
+    date_hierarchy = 'created'
 
+    def matching_ids(self, terms):
+        return search.matching_comment_ids(terms)
 
-class FollowAdmin(admin.ModelAdmin):
+
+class FollowAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'user',
         'author',
     )
-    list_filter = ('user',)
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    # Точное совпадение имени идёт по уникальному индексу username.
+    search_fields = ('=user__username', '=author__username')
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
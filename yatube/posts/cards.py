@@ -0,0 +1,41 @@
+'''Кеш отрисованных карточек постов («матрёшка»).
+
+Карточка поста одинакова на главной, на странице группы, в профиле
+автора и в ленте каждого подписчика, поэтому рисуется один раз и
+хранится под ключом из id поста и его updated_at. Всё, что видно в
+карточке, при изменении сдвигает updated_at: правка поста, миниатюра,
+комментарии, группа, имя автора (см. posts.signals). Старые версии
+карточек просто перестают читаться.
+'''
+from django.core.cache import cache
+from django.template.loader import get_template
+
+from core import metrics
+
+TEMPLATE = 'posts/includes/post_card.html'
+# Срок жизни нужен только чтобы вытеснять карточки старых версий.
+TIMEOUT: int = 7 * 24 * 60 * 60
+
+
+def card_key(post):
+    return f'card:{post.pk}:{post.updated_at.timestamp()}'
+
+
+def render_cards(posts):
+    '''HTML карточек `posts` в том же порядке. Все карточки читаются
+    одним get_many, недостающие рисуются и пишутся одним set_many.'''
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {}
+    template = None
+    for key, post in zip(keys, posts):
+        metrics.record_cache(key in cards)
+        if key in cards or key in missing:
+            continue
+        template = template or get_template(TEMPLATE)
+        missing[key] = template.render({'post': post})
+    if missing:
+        cache.set_many(missing, TIMEOUT)
+        cards.update(missing)
+    return [cards[key] for key in keys]
@@ -0,0 +1,116 @@
+'''Условные GET-запросы (If-None-Match → 304 Not Modified).
+
+ETag страницы собирается из поколений её областей (posts.generations),
+области подписок пользователя и его id из сессии: пока поколения не
+сменились, страница отдаётся ответом 304 без запросов постов и без
+рендера шаблона.
+'''
+import hashlib
+from functools import wraps
+
+from django.contrib.auth import SESSION_KEY
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import generations
+from .models import Follow, Post
+
+
+def session_user_id(request):
+    '''id вошедшего пользователя прямо из сессии, без запроса к
+    таблице пользователей.'''
+    return request.session.get(SESSION_KEY)
+
+
+def user_scopes(request):
+    '''Области, от которых зависят фрагменты страницы для пользователя
+    (core.late_fragments): его подписки меняют кнопку подписки и ленту
+    избранных авторов.'''
+    user_id = session_user_id(request)
+    return [generations.follow_scope(user_id)] if user_id else []
+
+
+def page_etag(request, *scopes, tokens=None):
+    '''ETag страницы, которая зависит от `scopes` и от пользователя.
+
+    `tokens` — уже прочитанные токены поколений, если они есть.
+    '''
+    user_id = session_user_id(request) or ''
+    scopes = [*scopes, *user_scopes(request)]
+    tokens = generations.get_tokens(scopes, tokens)
+    token = '%s:%s' % (user_id, '.'.join(tokens[scope] for scope in scopes))
+    return hashlib.md5(token.encode()).hexdigest()
+
+
+def conditional(etag_func):
+    '''Декоратор view: ETag от `etag_func` и ответ 304, если клиент
+    прислал тот же ETag. Браузер и прокси хранят страницу, но каждый
+    раз сверяют её с сервером.'''
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, no_cache=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapped
+    return decorator
+
+
+def index_etag(request):
+    return page_etag(request, generations.INDEX)
+
+
+def group_etag(request, slug):
+    return page_etag(request, generations.group_scope(slug))
+
+
+def profile_etag(request, username):
+    return page_etag(request, generations.author_scope(username))
+
+
+def post_page_scopes(post_id):
+    '''Области страницы поста или None, если поста нет.
+
+    На странице есть и число постов автора, поэтому нужна область
+    автора, а её имя знает только база. Области группы не нужно:
+    сохранение группы начинает новое поколение всех её постов.
+    '''
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True).first()
+    if username is None:
+        return None
+    return [
+        generations.post_scope(post_id),
+        generations.author_scope(username),
+    ]
+
+
+def post_etag(request, post_id):
+    scopes = getattr(request, 'post_page_scopes', None)
+    if scopes is None:
+        scopes = post_page_scopes(post_id)
+    if scopes is None:
+        return None
+    return page_etag(request, *scopes)
+
+
+def followed_author_scopes(request):
+    '''Области авторов, на которых подписан пользователь: лента подписок
+    меняется только с их постами. Читаются из базы раз за запрос.'''
+    scopes = getattr(request, 'followed_author_scopes', None)
+    if scopes is None:
+        usernames = Follow.objects.filter(
+            user_id=session_user_id(request)
+        ).order_by('author__username').values_list(
+            'author__username', flat=True)
+        scopes = list(map(generations.author_scope, usernames))
+        request.followed_author_scopes = scopes
+    return scopes
+
+
+def follow_etag(request):
+    # Область подписок пользователя добавляет page_etag.
+    return page_etag(request, *followed_author_scopes(request))
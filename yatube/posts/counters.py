@@ -0,0 +1,118 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from core.cache import get_or_build
+
+from .models import Comment, Counter, Follow, Post
+
+TOTAL_POSTS_CACHE_KEY = 'counters:posts:total'
+TOTAL_POSTS_TIMEOUT: int = 60
+
+
+def author_posts_key(author_id):
+    return f'author:{author_id}:posts'
+
+
+def group_posts_key(group_id):
+    return f'group:{group_id}:posts'
+
+
+def post_comments_key(post_id):
+    return f'post:{post_id}:comments'
+
+
+def author_followers_key(author_id):
+    return f'author:{author_id}:followers'
+
+
+# Счётчики по виду ключа: (модель, поле со ссылкой на объект ключа).
+COUNTED = {
+    ('author', 'posts'): (Post, 'author_id'),
+    ('group', 'posts'): (Post, 'group_id'),
+    ('post', 'comments'): (Comment, 'post_id'),
+    ('author', 'followers'): (Follow, 'author_id'),
+}
+
+
+def get_count(key, queryset):
+    '''Значение счётчика; при первом обращении считается по queryset.'''
+    value = Counter.objects.filter(key=key).values_list(
+        'value', flat=True).first()
+    if value is None:
+        value = recount(key, queryset)
+    return value
+
+
+def recount(key, queryset):
+    '''Пересчитывает счётчик по queryset и возвращает значение.
+
+    Строка счётчика заводится заранее, поэтому change() из других
+    транзакций с этого момента сдвигает её. COUNT(*) идёт под
+    блокировкой строки (в SQLite — всей базы на запись): сдвиги ждут
+    конца пересчёта и ложатся уже на посчитанное значение, а не теряются.
+    '''
+    Counter.objects.get_or_create(key=key)
+    with transaction.atomic():
+        # UPDATE берёт блокировку до конца транзакции.
+        Counter.objects.filter(key=key).update(value=F('value'))
+        value = queryset.count()
+        Counter.objects.filter(key=key).update(value=value)
+    return value
+
+
+def counted_queryset(key):
+    '''Queryset, по которому считается счётчик `key`, или None, если
+    ключ — не счётчик (например, пометка знаменитости в posts.feeds).'''
+    parts = key.split(':')
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    counted = COUNTED.get((parts[0], parts[2]))
+    if counted is None:
+        return None
+    model, field = counted
+    return model.objects.filter(**{field: int(parts[1])})
+
+
+def reconcile():
+    '''Сверяет все заведённые счётчики с COUNT(*) и исправляет
+    разошедшиеся; возвращает число исправленных.'''
+    fixed = 0
+    rows = Counter.objects.values_list('key', 'value').order_by('pk')
+    for key, value in rows.iterator():
+        queryset = counted_queryset(key)
+        if queryset is None or queryset.count() == value:
+            continue
+        recount(key, queryset)
+        fixed += 1
+    return fixed
+
+
+def change(key, delta):
+    '''Атомарно сдвигает счётчик, если он уже заведён.
+
+    Незаведённый счётчик не трогаем: при чтении он посчитается заново.
+    '''
+    Counter.objects.filter(key=key).update(value=F('value') + delta)
+
+
+def author_posts(author):
+    return get_count(author_posts_key(author.pk), author.posts.all())
+
+
+def group_posts(group):
+    return get_count(group_posts_key(group.pk), group.posts.all())
+
+
+def post_comments(post):
+    return get_count(post_comments_key(post.pk), post.comments.all())
+
+
+def total_posts():
+    '''Общее число постов для главной: COUNT(*) не чаще раза в минуту.'''
+    return get_or_build(
+        TOTAL_POSTS_CACHE_KEY, Post.objects.count, TOTAL_POSTS_TIMEOUT)
+
+
+def reset_total_posts():
+    cache.delete(TOTAL_POSTS_CACHE_KEY)
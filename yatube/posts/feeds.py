@@ -0,0 +1,90 @@
+'''Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, поэтому
+`follow_index` читает одну таблицу по индексу (user, -pub_date).
+Авторы, у которых подписчиков больше FANOUT_LIMIT, помечаются как
+«знаменитости»: их посты не рассылаются, а подмешиваются при чтении.
+'''
+from . import counters
+from .models import Counter, FeedEntry, Follow, Post
+
+FANOUT_LIMIT: int = 1000
+BATCH_SIZE: int = 500
+
+
+def celebrity_key(author_id):
+    return f'author:{author_id}:celebrity'
+
+
+def is_celebrity(author_id):
+    return Counter.objects.filter(key=celebrity_key(author_id)).exists()
+
+
+def followers_count(author):
+    return counters.get_count(
+        counters.author_followers_key(author.pk),
+        Follow.objects.filter(author=author)
+    )
+
+
+def mark_celebrity(author):
+    '''Помечает автора знаменитостью. Пометка не снимается, чтобы
+    посты, опубликованные без рассылки, не пропали из лент.'''
+    if followers_count(author) > FANOUT_LIMIT:
+        Counter.objects.get_or_create(key=celebrity_key(author.pk))
+
+
+def fan_out(post):
+    '''Раскладывает новый пост по лентам подписчиков автора.'''
+    if is_celebrity(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in follower_ids.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(user, author):
+    '''Добавляет в ленту подписчика уже опубликованные посты автора.'''
+    if is_celebrity(author.pk):
+        return
+    posts = Post.objects.filter(author=author).values_list('id', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user=user, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def prune(user, author):
+    '''Убирает из ленты подписчика посты автора после отписки.'''
+    FeedEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def timeline(user):
+    '''Посты ленты подписок пользователя.'''
+    followed = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True)
+    celebrity_ids = [
+        int(key.split(':')[1])
+        for key in Counter.objects.filter(
+            key__in=[celebrity_key(author_id) for author_id in followed]
+        ).values_list('key', flat=True)
+    ]
+    if not celebrity_ids:
+        return Post.objects.filter(feed_entries__user=user).order_by(
+            '-feed_entries__pub_date')
+    # Лента и посты знаменитостей читаются каждая по своему индексу и
+    # склеиваются UNION ALL: без JOIN с OR и DISTINCT по всей выборке.
+    # FeedEntry.pub_date — копия Post.pub_date, так что порядок тот же.
+    entries = FeedEntry.objects.filter(user=user).values('post_id')
+    celebrity_posts = Post.objects.filter(
+        author_id__in=celebrity_ids).order_by().values('id')
+    return Post.objects.filter(
+        pk__in=entries.union(celebrity_posts, all=True)
+    ).order_by('-pub_date', '-id')
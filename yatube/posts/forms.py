@@ -1,5 +1,6 @@
 from django import forms
 
+from . import uploads
 from .models import Post, Comment
 
 
@@ -18,6 +19,28 @@ class PostForm(forms.ModelForm):
             'group': 'Группа, к которой будет относиться пост',
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Обрезанный загрузчиком файл до ImageField не доходит: его не
+        # нужно пытаться открывать.
+        self.image_too_large = uploads.too_large(self.files.get('image'))
+        if self.image_too_large:
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if self.image_too_large:
+            raise forms.ValidationError(
+                'Файл больше %(size)s МБ',
+                params={'size': uploads.MAX_UPLOAD_SIZE // (1024 * 1024)}
+            )
+        if not image or 'image' not in self.changed_data:
+            return image
+        if uploads.too_many_pixels(image):
+            raise forms.ValidationError('Слишком большое разрешение картинки')
+        return uploads.reencode(image)
+
     def clean_data(self):
         data = self.cleaned_data['text']
         if '' in data.lower():
@@ -0,0 +1,41 @@
+'''Фрагменты страниц постов, которые зависят от пользователя
+(см. core.late_fragments).'''
+from django.template.loader import render_to_string
+
+from core.late_fragments import register
+
+from .forms import CommentForm
+from .models import Follow
+
+
+@register('switcher')
+def switcher(request):
+    '''Вкладки «Все авторы / Избранные авторы».'''
+    return render_to_string(
+        'posts/includes/switcher.html', {'user': request.user})
+
+
+@register('follow_button')
+def follow_button(request, username):
+    '''Кнопка «Подписаться/Отписаться» на странице профиля.'''
+    user = request.user
+    if user.username == username:
+        return ''
+    following = user.is_authenticated and Follow.objects.filter(
+        user=user, author__username=username).exists()
+    return render_to_string(
+        'posts/includes/follow_button.html',
+        {'username': username, 'following': following}
+    )
+
+
+@register('comment_form')
+def comment_form(request, post_id):
+    '''Форма комментария с CSRF-токеном текущего пользователя.'''
+    if not request.user.is_authenticated:
+        return ''
+    return render_to_string(
+        'posts/includes/comment_form.html',
+        {'form': CommentForm(), 'post_id': post_id},
+        request=request
+    )
@@ -0,0 +1,100 @@
+'''Поколения кеша по областям (scope).
+
+У каждой области — главной, группы, автора, поста, ленты подписок —
+есть токен поколения. Ключи кеша включают токены своих областей, а
+сигналы Post/Comment/Group/Follow меняют токены только затронутых
+областей: старые записи просто перестают читаться и вытесняются
+кешем, поэтому срок жизни не нужен ни им, ни самим токенам. Сигнал
+меняет токен только в своём кеше, поэтому воркерам нужен общий кеш.
+'''
+import hashlib
+import uuid
+
+from django.core.cache import cache
+
+INDEX = 'index'
+BUMP_BATCH_SIZE: int = 1000
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def _key(scope):
+    # Слаги и имена пользователей бывают не ASCII, а memcached такие
+    # ключи не принимает.
+    return f'generation:{hashlib.md5(scope.encode()).hexdigest()}'
+
+
+def get_with_generations(keys, scopes):
+    '''Значения ключей кеша `keys` и токены поколений `scopes` одним
+    get_many: ({ключ: значение}, {область: токен}).'''
+    generation_keys = {_key(scope): scope for scope in scopes}
+    values = cache.get_many([*keys, *generation_keys])
+    missing = {
+        key: uuid.uuid4().hex for key in generation_keys
+        if key not in values
+    }
+    if missing:
+        cache.set_many(missing, None)
+        values.update(missing)
+    tokens = {
+        scope: values.pop(key) for key, scope in generation_keys.items()
+    }
+    return values, tokens
+
+
+def get_tokens(scopes, known=None):
+    '''Токены поколений `scopes`; уже прочитанные берутся из `known`.'''
+    known = known or {}
+    missing = [scope for scope in scopes if scope not in known]
+    if not missing:
+        return known
+    _, tokens = get_with_generations((), missing)
+    return {**known, **tokens}
+
+
+def get_generation(*scopes):
+    '''Общий токен поколения для набора областей.'''
+    _, tokens = get_with_generations((), scopes)
+    return '.'.join(tokens[scope] for scope in scopes)
+
+
+def bump(*scopes):
+    '''Начинает новое поколение для областей.'''
+    cache.set_many(
+        {_key(scope): uuid.uuid4().hex for scope in scopes if scope},
+        None
+    )
+
+
+def bump_batched(scopes):
+    '''Начинает новое поколение для областей пачками по BUMP_BATCH_SIZE.'''
+    scopes = list(scopes)
+    for start in range(0, len(scopes), BUMP_BATCH_SIZE):
+        bump(*scopes[start:start + BUMP_BATCH_SIZE])
+
+
+def bump_posts(post_ids):
+    '''Начинает новое поколение для постов.'''
+    bump_batched(map(post_scope, post_ids))
+
+
+def post_scopes(post):
+    '''Области, на которых виден пост.'''
+    scopes = [INDEX, author_scope(post.author.username), post_scope(post.pk)]
+    if post.group_id:
+        scopes.append(group_scope(post.group.slug))
+    return scopes
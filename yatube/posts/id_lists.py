@@ -0,0 +1,175 @@
+'''Кеш страниц лент в виде списков id и сборка постов по кешу объектов.
+
+Страница ленты (главной, группы, автора, подписок) хранится как список
+строк (id, updated_at, author_id, group_id) под ключом из адреса и
+областей ленты с версией — поколением этих областей (posts.generations),
+поэтому новый или изменённый пост сбрасывает только списки своих
+областей. Сами посты, авторы и группы лежат в кеше объектов: пост — под
+id и updated_at, автор и группа — под id. Страница собирается одним
+get_many по всем ключам, а недостающие посты достаются одним in_bulk.
+Всё, что меняет карточку поста, сдвигает его updated_at и меняет
+поколения всех его областей (posts.signals), так что строки списков не
+ссылаются на устаревшие версии постов.
+'''
+import hashlib
+
+from django.core.cache import cache
+from django.core.paginator import Page
+
+from core import metrics
+from core.cache import get_or_build
+
+from . import generations
+from .models import Post
+from .utils import COUNT, CountedPaginator, CursorPage, CursorPaginator
+
+# Срок жизни постов нужен только чтобы вытеснять старые версии;
+# пользователей и группы сигналы удаляют из кеша при сохранении.
+OBJECT_TIMEOUT: int = 24 * 60 * 60
+# Поля авторов и групп, которые выводятся в лентах; остальные, в том
+# числе хеш пароля, в кеш не попадают.
+USER_FIELDS = ('id', 'username', 'first_name', 'last_name')
+GROUP_FIELDS = ('id', 'title', 'slug')
+
+
+def post_key(post_id, updated_at):
+    return f'obj:post:{post_id}:{updated_at.timestamp()}'
+
+
+def user_key(user_id):
+    return f'obj:user:{user_id}'
+
+
+def group_key(group_id):
+    return f'obj:group:{group_id}'
+
+
+def _rows(posts):
+    return [
+        (post.id, post.updated_at, post.author_id, post.group_id)
+        for post in posts
+    ]
+
+
+def _trimmed(obj, fields):
+    '''Копия объекта, в которой загружены только поля `fields`.'''
+    names = [
+        field.attname for field in obj._meta.concrete_fields
+        if field.attname in fields
+    ]
+    return type(obj).from_db(
+        obj._state.db, names, [getattr(obj, name) for name in names])
+
+
+def store(posts):
+    '''Кладёт посты, их авторов и группы в кеш объектов; возвращает
+    положенное по ключам.'''
+    entries = {}
+    objects = {}
+    related = []
+    for post in posts:
+        author, group = post.author, post.group
+        objects[user_key(author.pk)] = _trimmed(author, USER_FIELDS)
+        if group is not None:
+            objects[group_key(group.pk)] = _trimmed(group, GROUP_FIELDS)
+        entries[post_key(post.pk, post.updated_at)] = post
+        related.append((post, author, group))
+        # Автор и группа хранятся отдельно от поста.
+        post._state.fields_cache.clear()
+    entries.update(objects)
+    try:
+        cache.set_many(entries, OBJECT_TIMEOUT)
+    finally:
+        for post, author, group in related:
+            post.author, post.group = author, group
+    return entries
+
+
+def hydrate(rows):
+    '''Посты по строкам списка id в том же порядке, с авторами, группами
+    и числом комментариев. Удалённые посты пропускаются.'''
+    keys = set()
+    for post_id, updated_at, author_id, group_id in rows:
+        keys.add(post_key(post_id, updated_at))
+        keys.add(user_key(author_id))
+        if group_id:
+            keys.add(group_key(group_id))
+    cached = cache.get_many(list(keys))
+    missing = [
+        post_id for post_id, updated_at, author_id, group_id in rows
+        if post_key(post_id, updated_at) not in cached
+        or user_key(author_id) not in cached
+        or (group_id and group_key(group_id) not in cached)
+    ]
+    for _ in range(len(rows) - len(missing)):
+        metrics.record_cache(hit=True)
+    for _ in missing:
+        metrics.record_cache(hit=False)
+    fresh = {}
+    if missing:
+        fresh = Post.objects.for_feed().in_bulk(missing)
+        cached.update(store(fresh.values()))
+    posts = []
+    for post_id, updated_at, author_id, group_id in rows:
+        post = fresh.get(post_id)
+        if post is None:
+            post = cached.get(post_key(post_id, updated_at))
+            if post is None:
+                continue
+            post.author = cached[user_key(author_id)]
+            post.group = cached[group_key(group_id)] if group_id else None
+        posts.append(post)
+    return posts
+
+
+def feed_page(request, queryset, scopes, count=None):
+    '''Страница ленты для `?page=` (CountedPaginator) или `?cursor=`
+    (CursorPaginator по FEED_ORDERING), список id и сами посты берутся из
+    кеша.
+
+    `queryset` — посты с for_feed() или функция, которая их вернёт, если
+    сам запрос недёшево собрать (лента подписок). `scopes` — области
+    ленты из posts.generations. `count` — число постов или функция,
+    которая его вернёт. Функции вызываются, только когда список
+    строится заново.
+    '''
+    path = '%s|%s' % (request.get_full_path(), ','.join(scopes))
+    key = 'ids:' + hashlib.md5(path.encode()).hexdigest()
+    version = generations.get_generation(*scopes)
+    # Если список строился в этом запросе, посты уже загружены.
+    built = []
+
+    def feed():
+        return queryset() if callable(queryset) else queryset
+
+    def page_rows(page):
+        posts = list(page)
+        store(posts)
+        built.append(posts)
+        return _rows(posts)
+
+    if 'cursor' in request.GET:
+        paginator = CursorPaginator(Post.objects.none(), COUNT)
+
+        def build():
+            paginator.object_list = feed()
+            page = paginator.get_page(request.GET.get('cursor'))
+            return (page_rows(page), page.cursor, page.next_cursor,
+                    page.previous_cursor)
+
+        rows, cursor, next_cursor, previous_cursor = get_or_build(
+            key, build, version=version)
+        posts = built[0] if built else hydrate(rows)
+        return CursorPage(
+            posts, paginator, cursor, next_cursor, previous_cursor)
+
+    def build():
+        paginator = CountedPaginator(
+            feed(), COUNT, count=count() if callable(count) else count)
+        page = paginator.get_page(request.GET.get('page'))
+        return page_rows(page), page.number, paginator.count
+
+    rows, number, total = get_or_build(key, build, version=version)
+    posts = built[0] if built else hydrate(rows)
+    paginator = CountedPaginator(Post.objects.none(), COUNT, count=total)
+    return Page(posts, number, paginator)
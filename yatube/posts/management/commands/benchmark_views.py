@@ -0,0 +1,166 @@
+import json
+import math
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, teardown_databases
+)
+from django.urls import reverse
+
+from posts import seeding
+from posts.models import Follow, Group, Post, User
+
+SIZES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+PERCENTILES = (50, 95, 99)
+# Метрики, для которых сравнение с базовой линией печатает разницу.
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'bytes')
+
+
+def percentile(durations, rank):
+    '''Процентиль по ближайшему рангу; `durations` отсортированы.'''
+    index = max(math.ceil(rank / 100 * len(durations)) - 1, 0)
+    return durations[index]
+
+
+def view_urls():
+    '''Адреса view из posts/views.py на самых «тяжёлых» объектах.'''
+    group = Group.objects.annotate(
+        posts_count=Count('posts')).order_by('-posts_count').first()
+    author = User.objects.annotate(
+        posts_count=Count('posts')).order_by('-posts_count').first()
+    post = Post.objects.annotate(
+        comments_count=Count('comments')
+    ).order_by('-comments_count').first()
+    return {
+        'index': reverse('posts:index'),
+        'group_posts': reverse('posts:group_list', args=(group.slug,)),
+        'profile': reverse('posts:profile', args=(author.username,)),
+        'post_detail': reverse('posts:post_detail', args=(post.pk,)),
+        'follow_index': reverse('posts:follow_index'),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Заполняет временную базу данными заданного объёма и замеряет '
+            'view-функции posts: задержку (p50/p95/p99), число SQL-запросов '
+            'и размер ответа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', choices=SIZES, default='10k',
+            help='Число постов в тестовой базе.'
+        )
+        parser.add_argument(
+            '--comments-per-post', type=int, default=1,
+            help='Сколько комментариев в среднем на пост.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько раз запрашивать каждую страницу.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора данных.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Куда записать результаты (JSON).'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON прошлого запуска, с которым сравнить результаты.'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должно быть больше нуля.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        # Замеры идут во временной базе, как в тестах: рабочие данные
+        # не трогаются.
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = self.run(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+        self.report(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+                file.write('\n')
+
+    def run(self, options):
+        started = time.perf_counter()
+        dataset = seeding.seed(
+            SIZES[options['size']],
+            comments_per_post=options['comments_per_post'],
+            seed=options['seed']
+        )
+        self.stdout.write(
+            f'Данные подготовлены за {time.perf_counter() - started:.1f} с: '
+            + ', '.join(f'{name} {count}' for name, count in dataset.items())
+        )
+        reader = Follow.objects.values_list('user', flat=True).first()
+        client = Client(SERVER_NAME='localhost')
+        client.force_login(User.objects.get(pk=reader))
+        views = {}
+        for name, url in view_urls().items():
+            views[name] = self.measure(client, url, options)
+        return {
+            'size': options['size'],
+            'seed': options['seed'],
+            'requests': options['requests'],
+            'cold': options['cold'],
+            'dataset': dataset,
+            'views': views,
+        }
+
+    def measure(self, client, url, options):
+        # Первый запрос прогревает счётчики и кеш и в замер не входит.
+        client.get(url)
+        durations = []
+        for _ in range(options['requests']):
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(url)
+                durations.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(
+                    f'{url} ответил {response.status_code}.')
+        durations.sort()
+        result = {
+            f'p{rank}_ms': round(percentile(durations, rank), 2)
+            for rank in PERCENTILES
+        }
+        result['queries'] = len(queries)
+        result['bytes'] = len(response.content)
+        return result
+
+    def report(self, results, baseline):
+        previous = baseline['views'] if baseline else {}
+        for name, metrics in results['views'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for metric in COMPARED:
+                line = f'  {metric}: {metrics[metric]}'
+                old = previous.get(name, {}).get(metric)
+                if old:
+                    change = (metrics[metric] - old) / old * 100
+                    line += f' (было {old}, {change:+.1f}%)'
+                self.stdout.write(line)
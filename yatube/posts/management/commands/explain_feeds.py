@@ -0,0 +1,60 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import feeds
+from posts.models import Follow, Group, Post, User
+from posts.utils import COUNT, CursorPaginator
+
+FULL_SCAN_PATTERNS = (
+    # SQLite: «SCAN posts_post» без индекса.
+    re.compile(r'\bSCAN (TABLE )?\w+(?! USING)\s*$', re.MULTILINE),
+    # PostgreSQL.
+    re.compile(r'\bSeq Scan\b'),
+)
+TEMP_SORT_PATTERN = re.compile(r'USE TEMP B-TREE FOR ORDER BY')
+
+
+def feed_queries():
+    '''Запросы, которые выполняют view-функции из posts/views.py.'''
+    user = User(pk=0)
+    group = Group(pk=0)
+    post = Post(pk=0)
+    cursor_paginator = CursorPaginator(Post.objects.for_feed(), COUNT)
+    return {
+        'index': Post.objects.for_feed()[:COUNT],
+        'index (cursor)': cursor_paginator.object_list.filter(
+            cursor_paginator.after(timezone.now(), 0)
+        ).order_by(*cursor_paginator.ordering)[:COUNT],
+        'group_posts': group.posts.for_feed()[:COUNT],
+        'profile': user.posts.for_feed()[:COUNT],
+        'profile (following)': Follow.objects.filter(
+            author=user, user=user),
+        'post_detail': Post.objects.select_related(
+            'author', 'group').filter(pk=post.pk),
+        'post_detail (comments)': post.comments.select_related(
+            'author').order_by('created'),
+        'follow_index': feeds.timeline(user).for_feed()[:COUNT],
+    }
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов лент и падает, если какой-то '
+            'из них читает таблицу целиком.')
+
+    def handle(self, *args, **options):
+        failed = []
+        for name, queryset in feed_queries().items():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            if any(pattern.search(plan) for pattern in FULL_SCAN_PATTERNS):
+                failed.append(name)
+                self.stdout.write(self.style.ERROR('  full scan'))
+            elif TEMP_SORT_PATTERN.search(plan):
+                self.stdout.write(self.style.WARNING('  sorts in memory'))
+        if failed:
+            raise CommandError(
+                'Полное сканирование таблицы: ' + ', '.join(failed))
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
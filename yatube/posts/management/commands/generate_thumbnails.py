@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Готовит миниатюры постов, у которых их нет: загруженных до '
+            'появления фоновой очереди или потерянных вместе с очередью '
+            'при перезапуске. Запускайте после каждого перезапуска.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать миниатюры и для постов, у которых они уже есть.'
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            posts = Post.objects.exclude(image='').order_by('pk')
+            post_ids = list(posts.values_list('pk', flat=True))
+        else:
+            post_ids = list(thumbnails.pending_post_ids())
+        total = len(post_ids)
+        for number, post_id in enumerate(post_ids, start=1):
+            thumbnails.generate(post_id)
+            if number % 100 == 0 or number == total:
+                self.stdout.write(f'{number}/{total}')
+        self.stdout.write(self.style.SUCCESS(f'Готово миниатюр: {total}'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+from posts.models import Comment, Post, SearchTerm
+
+BATCH_SIZE: int = 1000
+
+
+class Command(BaseCommand):
+    help = ('Заново строит поисковый индекс по всем постам и '
+            'комментариям. Дальше индекс обновляется сигналами.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            SearchTerm.objects.all().delete()
+            posts = Post.objects.only('pk', 'text').order_by('pk')
+            comments = Comment.objects.only(
+                'pk', 'post_id', 'text').order_by('pk')
+            indexed = self.build(posts.iterator(), search.post_entries)
+            indexed += self.build(
+                comments.iterator(), search.comment_entries)
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано: {indexed}'))
+
+    def build(self, objects, entries):
+        batch = []
+        count = 0
+        for count, obj in enumerate(objects, start=1):
+            batch.extend(entries(obj))
+            if len(batch) >= BATCH_SIZE:
+                SearchTerm.objects.bulk_create(batch)
+                batch = []
+        SearchTerm.objects.bulk_create(batch)
+        return count
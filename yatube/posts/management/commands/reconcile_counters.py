@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики постов, комментариев и подписчиков с '
+            'COUNT(*) и исправляет разошедшиеся. Запускайте '
+            'периодически, например из cron.')
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile()
+        self.stdout.write(self.style.SUCCESS(f'Исправлено счётчиков: {fixed}'))
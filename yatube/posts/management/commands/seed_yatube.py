@@ -0,0 +1,82 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import seeding
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Быстро наполняет базу пользователями, группами, постами, '
+            'комментариями и подписками для нагрузочных замеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=10_000,
+            help='Сколько постов создать.'
+        )
+        parser.add_argument(
+            '--users', type=int,
+            help='Сколько пользователей создать (по умолчанию — один на '
+                 f'{seeding.POSTS_PER_USER} постов).'
+        )
+        parser.add_argument(
+            '--groups', type=int,
+            help='Сколько групп создать (по умолчанию — одна на '
+                 f'{seeding.POSTS_PER_GROUP} постов).'
+        )
+        parser.add_argument(
+            '--comments-per-post', type=int, default=1,
+            help='Сколько комментариев в среднем на пост.'
+        )
+        parser.add_argument(
+            '--follows-per-user', type=int,
+            default=seeding.FOLLOWS_PER_USER,
+            help='На скольких авторов подписан каждый пользователь.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора: одно зерно — одни и те же данные.'
+        )
+        parser.add_argument(
+            '--search-index', action='store_true',
+            help='Заодно построить поисковый индекс.'
+        )
+
+    def handle(self, *args, **options):
+        if options['posts'] < 1:
+            raise CommandError('--posts должно быть больше нуля.')
+        prefix = f"seed{options['seed']}_user_"
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f"Данные с зерном {options['seed']} уже есть в базе, "
+                'выберите другое --seed.'
+            )
+        self.started = time.perf_counter()
+        self.reported = {}
+        dataset = seeding.seed(
+            options['posts'],
+            users=options['users'],
+            groups=options['groups'],
+            comments_per_post=options['comments_per_post'],
+            follows_per_user=options['follows_per_user'],
+            seed=options['seed'],
+            progress=self.progress
+        )
+        if options['search_index']:
+            call_command('rebuild_search_index', stdout=self.stdout)
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {elapsed:.1f} с: '
+            + ', '.join(f'{name} {count}' for name, count in dataset.items())
+        ))
+
+    def progress(self, label, done, total):
+        # Не чаще, чем на каждые 10% каждой таблицы.
+        step = done * 10 // max(total, 1)
+        if self.reported.get(label) == step and done < total:
+            return
+        self.reported[label] = step
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f'[{elapsed:7.1f} с] {label}: {done}/{total}')
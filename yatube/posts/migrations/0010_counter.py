@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_auto_20230217_2204'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Ключ')),
+                ('value', models.IntegerField(default=0, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Счётчик',
+                'verbose_name_plural': 'Счётчики',
+            },
+        ),
+    ]
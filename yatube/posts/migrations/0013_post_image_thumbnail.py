@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_thumbnail',
+            field=models.CharField(blank=True, editable=False, help_text='Адрес заранее подготовленной миниатюры картинки', max_length=255, verbose_name='Миниатюра'),
+        ),
+    ]
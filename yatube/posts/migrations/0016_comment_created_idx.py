@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_searchterm'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created'], name='comment_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_comment_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Версия отрисованной карточки поста (posts.cards)', verbose_name='Дата изменения'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.28 on 2026-10-18 18:52
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_follows(apps, schema_editor):
+    '''Оставляет по одной подписке на пару (подписчик, автор).'''
+    Follow = apps.get_model('posts', 'Follow')
+    duplicates = Follow.objects.values('user_id', 'author_id').annotate(
+        first=Min('id'), total=Count('id')).filter(total__gt=1)
+    for pair in duplicates.iterator():
+        Follow.objects.filter(
+            user_id=pair['user_id'], author_id=pair['author_id']
+        ).exclude(id=pair['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_image_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique follow'),
+        ),
+    ]
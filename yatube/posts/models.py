@@ -1,9 +1,48 @@
 from django.db import models
+from django.db.models.functions import Coalesce, Concat
 from django.contrib.auth import get_user_model
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    '''Запросы к постам.'''
+
+    def for_feed(self):
+        '''Посты для лент: автор и группа одним JOIN, число комментариев
+        из счётчика, без неиспользуемых в шаблонах колонок. Если счётчик
+        ещё не заведён, комментарии считаются подзапросом.'''
+        # Ключ — counters.post_comments_key(post_id).
+        counter = Counter.objects.filter(
+            key=Concat(
+                models.Value('post:'),
+                models.OuterRef('pk'),
+                models.Value(':comments'),
+                output_field=models.CharField()
+            )
+        ).values('value')[:1]
+        comments = Comment.objects.filter(
+            post=models.OuterRef('pk')
+        ).order_by().values('post').annotate(
+            count=models.Count('*')
+        ).values('count')
+        return self.select_related('author', 'group').defer(
+            'author__password',
+            'author__email',
+            'author__last_login',
+            'author__date_joined',
+            'group__description',
+        ).annotate(
+            comment_count=Coalesce(
+                models.Subquery(counter, output_field=models.IntegerField()),
+                models.Subquery(comments, output_field=models.IntegerField()),
+                0
+            )
+        )
+
+
 class Post(models.Model):
     '''Модель управления постами.'''
     text = models.TextField(
@@ -32,13 +71,43 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        db_index=True
+    )
+    image_thumbnail = models.CharField(
+        'Миниатюра',
+        max_length=255,
+        blank=True,
+        editable=False,
+        help_text='Адрес заранее подготовленной миниатюры картинки'
+    )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        help_text='Версия отрисованной карточки поста (posts.cards)'
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -73,6 +142,15 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+            models.Index(fields=['created'], name='comment_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     '''Модель подписок на автора.'''
@@ -96,3 +174,105 @@ class Follow(models.Model):
                 name='unique follow'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class Counter(models.Model):
+    '''Денормализованный счётчик под строковым ключом.
+
+    Виды ключей (posts.counters, posts.feeds):
+    author:<id>:posts — посты автора;
+    group:<id>:posts — посты группы;
+    post:<id>:comments — комментарии поста;
+    author:<id>:followers — подписчики автора;
+    author:<id>:celebrity — не счётчик, а пометка знаменитости: важна
+    сама строка, value не используется.
+    '''
+    key = models.CharField(
+        'Ключ',
+        max_length=64,
+        unique=True
+    )
+    value = models.IntegerField(
+        'Значение',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Счётчик'
+        verbose_name_plural = 'Счётчики'
+
+    def __str__(self):
+        return f'{self.key}={self.value}'
+
+
+class FeedEntry(models.Model):
+    '''Запись ленты подписок: пост автора, разосланный подписчику.'''
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique feed entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'],
+                name='feed_user_pub_date_idx'
+            ),
+        ]
+
+
+class SearchTerm(models.Model):
+    '''Обратный индекс для поиска: слово, пост и вес вхождений.
+
+    Строки с comment = NULL получены из текста поста, остальные — из
+    комментария к нему.
+    '''
+    term = models.CharField('Слово', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Пост'
+    )
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='search_terms',
+        verbose_name='Комментарий'
+    )
+    weight = models.PositiveIntegerField('Вес')
+
+    class Meta:
+        verbose_name = 'Слово поиска'
+        verbose_name_plural = 'Поисковый индекс'
+        indexes = [
+            models.Index(
+                fields=['term', 'post'],
+                name='search_term_post_idx'
+            ),
+        ]
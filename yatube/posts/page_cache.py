@@ -0,0 +1,222 @@
+'''Кеш целых страниц, общий для всех читателей.
+
+PageCacheMiddleware хранит ответы главной, страниц групп, профилей и
+постов под ключом из адреса с параметрами. Страница от пользователя не
+зависит: его куски выводятся метками core.late_fragments, поэтому одна
+запись служит и гостям, и вошедшим. Куски страницы между метками
+хранятся уже сжатыми, каждый своим потоком deflate с выталкиванием в
+конце (Z_SYNC_FLUSH): такие потоки можно склеить. При попадании
+сжимаются только фрагменты текущего пользователя, и ответ gzip
+собирается из готовых кусков без распаковки; контрольная сумма CRC-32
+тоже складывается из сохранённых сумм кусков. Вместе с ответом хранятся
+токены поколений его областей (posts.generations): запись и текущие
+токены читаются одним get_many, и запись отдаётся, только если токены
+совпадают. Сигналы Post, Comment и Group меняют токены, поэтому
+страница устаревает сразу после правки, а не по таймеру.
+'''
+import hashlib
+import re
+import struct
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from core import late_fragments, metrics
+
+from . import generations
+from .conditional import page_etag, post_page_scopes, user_scopes
+
+# Срок жизни нужен только чтобы вытеснять страницы, которые больше не
+# запрашивают; актуальность записи проверяют поколения.
+TIMEOUT: int = 24 * 60 * 60
+COMPRESS_LEVEL: int = 6
+# Заголовки, которые не сохраняются вместе со страницей. ETag зависит
+# от пользователя и считается заново при каждом попадании.
+SKIPPED_HEADERS = ('content-length', 'content-encoding', 'etag')
+# Заголовки ответа 304 (RFC 7232, раздел 4.1).
+NOT_MODIFIED_HEADERS = ('ETag', 'Cache-Control', 'Vary', 'Expires')
+GZIP_RE = re.compile(r'\bgzip\b')
+# Заголовок gzip без имени файла и времени (RFC 1952, раздел 2.3).
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+# Последний, пустой блок deflate: им кончается сжатый поток.
+DEFLATE_END = b'\x03\x00'
+
+# Области страницы, которые известны по адресу.
+URL_SCOPES = {
+    'posts:index': lambda kwargs: [generations.INDEX],
+    'posts:group_list': lambda kwargs: [
+        generations.group_scope(kwargs['slug'])],
+    'posts:profile': lambda kwargs: [
+        generations.author_scope(kwargs['username'])],
+    'posts:post_detail': lambda kwargs: [
+        generations.post_scope(kwargs['post_id'])],
+}
+
+
+def page_key(request):
+    path = request.get_full_path().encode()
+    return f'page:{hashlib.md5(path).hexdigest()}'
+
+
+def _deflate(data):
+    '''Сжимает `data` отдельным потоком deflate, который можно
+    продолжить другим таким же потоком.'''
+    compressor = zlib.compressobj(
+        COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _crc_shift(length):
+    '''Сдвиг CRC-32 на `length` байт: crc32(data, crc) равен
+    crc32(data) ^ _shifted(crc, сдвиг) для любых `length` байт data.'''
+    zeros = bytes(length)
+    base = zlib.crc32(zeros)
+    return tuple(zlib.crc32(zeros, 1 << bit) ^ base for bit in range(32))
+
+
+def _shifted(crc, shift):
+    result = 0
+    for column in shift:
+        if crc & 1:
+            result ^= column
+        crc >>= 1
+    return result
+
+
+def make_entry(tokens, headers, content):
+    '''Запись кеша: куски страницы между метками фрагментов, сжатые и с
+    данными для CRC-32, и сами метки.'''
+    chunks, markers = late_fragments.split(content)
+    return (
+        tokens,
+        headers,
+        [(_deflate(chunk), len(chunk), zlib.crc32(chunk),
+          _crc_shift(len(chunk)))
+         for chunk in chunks],
+        markers,
+    )
+
+
+def _fragments(request, markers):
+    return [
+        late_fragments.render(request, name, args)
+        for name, args in markers
+    ] + [b'']
+
+
+def gzip_body(request, chunks, markers):
+    '''Тело gzip из сжатых кусков и фрагментов для `request`.'''
+    parts = [GZIP_HEADER]
+    crc = size = 0
+    for (data, length, chunk_crc, shift), fragment in zip(
+            chunks, _fragments(request, markers)):
+        parts.append(data)
+        crc = chunk_crc ^ _shifted(crc, shift)
+        if fragment:
+            parts.append(_deflate(fragment))
+            crc = zlib.crc32(fragment, crc)
+        size += length + len(fragment)
+    parts.append(DEFLATE_END)
+    parts.append(struct.pack('<II', crc, size & 0xffffffff))
+    return b''.join(parts)
+
+
+def plain_body(request, chunks, markers):
+    '''Несжатое тело из кусков и фрагментов для `request`.'''
+    return b''.join(
+        zlib.decompressobj(-zlib.MAX_WBITS).decompress(data) + fragment
+        for (data, *_), fragment in zip(
+            chunks, _fragments(request, markers))
+    )
+
+
+def cached_response(request, entry, etag):
+    tokens, headers, chunks, markers = entry
+    etag = quote_etag(etag)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        for name in NOT_MODIFIED_HEADERS:
+            if name in headers:
+                response[name] = headers[name]
+        response['ETag'] = etag
+        return response
+    send_gzip = GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if send_gzip:
+        body = gzip_body(request, chunks, markers)
+    else:
+        body = plain_body(request, chunks, markers)
+    response = HttpResponse(body)
+    for name, value in headers.items():
+        response[name] = value
+    response['ETag'] = etag
+    if send_gzip:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['Content-Length'] = str(len(body))
+    return response
+
+
+def is_cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+class PageCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PAGE_CACHE or request.method != 'GET':
+            return self.get_response(request)
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return self.get_response(request)
+        if match.view_name not in URL_SCOPES:
+            return self.get_response(request)
+        # Чтобы MetricsMiddleware учитывал и попадания в кеш.
+        request.resolver_match = match
+        key = page_key(request)
+        scopes = URL_SCOPES[match.view_name](match.kwargs)
+        values, tokens = generations.get_with_generations(
+            [key], scopes + user_scopes(request))
+        entry = values.get(key)
+        if entry is not None:
+            entry_tokens = entry[0]
+            tokens = generations.get_tokens(entry_tokens, tokens)
+            if all(tokens[scope] == token
+                   for scope, token in entry_tokens.items()):
+                metrics.record_cache(hit=True)
+                etag = page_etag(request, *entry_tokens, tokens=tokens)
+                return cached_response(request, entry, etag)
+        metrics.record_cache(hit=False)
+        if match.view_name == 'posts:post_detail':
+            scopes = post_page_scopes(match.kwargs['post_id'])
+            if scopes is None:
+                return self.get_response(request)
+            # Чтобы post_etag не искал автора поста второй раз.
+            request.post_page_scopes = scopes
+        tokens = generations.get_tokens(scopes, tokens)
+        # Токены прочитаны до рендера: правка во время рендера сменит их,
+        # и сохранённая страница сразу окажется устаревшей.
+        response = self.get_response(request)
+        if is_cacheable(response):
+            headers = {
+                name: value for name, value in response.items()
+                if name.lower() not in SKIPPED_HEADERS
+            }
+            entry = make_entry(
+                {scope: tokens[scope] for scope in scopes},
+                headers,
+                response.content
+            )
+            cache.set(key, entry, TIMEOUT)
+        return response
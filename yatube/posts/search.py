@@ -0,0 +1,94 @@
+'''Полнотекстовый поиск по постам и комментариям.
+
+Обратный индекс — таблица SearchTerm: для каждого слова поста или
+комментария хранится число его вхождений (вес). Индекс обновляется
+сигналами сохранения, а при удалении строки уходят каскадом. Поиск
+ищет посты, в которых встречаются все слова запроса, и ранжирует их по
+сумме весов; слова из текста поста весят больше, чем из комментариев.
+'''
+import re
+from collections import Counter
+
+from django.db.models import Count, Sum
+
+from .models import SearchTerm
+
+TERM_MAX_LENGTH: int = 64
+TERM_MIN_LENGTH: int = 2
+POST_WEIGHT: int = 3
+COMMENT_WEIGHT: int = 1
+# Слова запроса сверх этого числа отбрасываются.
+MAX_QUERY_TERMS: int = 8
+
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    '''Слова текста в нижнем регистре, «ё» приводится к «е».'''
+    words = WORD_RE.findall(text.lower().replace('ё', 'е'))
+    return [
+        word[:TERM_MAX_LENGTH] for word in words
+        if len(word) >= TERM_MIN_LENGTH
+    ]
+
+
+def parse_query(query):
+    '''Уникальные слова запроса в порядке появления.'''
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+def _entries(text, weight, **fields):
+    return [
+        SearchTerm(term=term, weight=count * weight, **fields)
+        for term, count in Counter(tokenize(text)).items()
+    ]
+
+
+def post_entries(post):
+    return _entries(post.text, POST_WEIGHT, post_id=post.pk)
+
+
+def comment_entries(comment):
+    return _entries(
+        comment.text, COMMENT_WEIGHT,
+        post_id=comment.post_id, comment_id=comment.pk
+    )
+
+
+def index_post(post):
+    '''Переиндексирует текст поста (комментарии не трогает).'''
+    SearchTerm.objects.filter(post=post, comment__isnull=True).delete()
+    SearchTerm.objects.bulk_create(post_entries(post))
+
+
+def index_comment(comment):
+    '''Переиндексирует текст комментария.'''
+    SearchTerm.objects.filter(comment=comment).delete()
+    SearchTerm.objects.bulk_create(comment_entries(comment))
+
+
+def _matches(terms):
+    return SearchTerm.objects.filter(term__in=terms)
+
+
+def ranked_posts(terms):
+    '''Словари {'post_id', 'rank'} постов со всеми словами, лучшие
+    первыми.'''
+    return _matches(terms).values('post_id').annotate(
+        rank=Sum('weight'),
+        matched=Count('term', distinct=True)
+    ).filter(matched=len(terms)).order_by('-rank', '-post_id')
+
+
+def matching_post_ids(terms):
+    '''Подзапрос id постов со всеми словами (текст или комментарии).'''
+    return ranked_posts(terms).order_by().values('post_id')
+
+
+def matching_comment_ids(terms):
+    '''Подзапрос id комментариев со всеми словами.'''
+    return _matches(terms).filter(comment__isnull=False).values(
+        'comment_id'
+    ).annotate(
+        matched=Count('term', distinct=True)
+    ).filter(matched=len(terms)).values('comment_id')
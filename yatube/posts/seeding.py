@@ -0,0 +1,237 @@
+'''Наполнение базы синтетическими данными для замеров производительности.
+
+Строки пишутся пачками через bulk_create, каждая пачка — в своей
+транзакции, поэтому сигналы не срабатывают: ленты подписок
+раскладываются здесь же запросами INSERT … SELECT, знаменитости
+помечаются по числу подписчиков, а счётчики заводятся лениво при первом
+чтении. Закешированные страницы не стираются: вместо этого начинаются
+новые поколения главной, новых групп, авторов и лент подписок, а общее
+число постов пересчитывается. Авторы постов и подписок выбираются по
+степенному закону: у немногих авторов большая часть постов и
+подписчиков, как в живой сети. Один и тот же `seed` даёт одни и те же
+данные, включая даты: они отсчитываются от EPOCH, а не от текущего
+момента.
+'''
+import itertools
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from . import counters, feeds, generations
+from .models import Comment, Counter, FeedEntry, Follow, Group, Post, User
+
+BATCH_SIZE: int = 5000
+POSTS_PER_USER: int = 50
+POSTS_PER_GROUP: int = 1000
+FOLLOWS_PER_USER: int = 10
+# Показатель степенного закона: вес i-го автора — 1 / (i + 1) ** ALPHA.
+ALPHA: float = 1.1
+# Доля постов без группы.
+NO_GROUP_SHARE: float = 0.2
+# Насколько далеко в прошлое от EPOCH раскиданы даты постов.
+HISTORY = timedelta(days=365)
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+WORDS = (
+    'лев толстой пушкин весна утро город река лес дорога письмо дом '
+    'музыка книга поезд море солнце ветер снег друг вечер окно сад'
+).split()
+
+
+@contextmanager
+def explicit_dates():
+    '''Позволяет задать pub_date и created вручную в bulk_create.'''
+    fields = [
+        Post._meta.get_field('pub_date'),
+        Comment._meta.get_field('created'),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def text(rng, words=12):
+    return ' '.join(rng.choices(WORDS, k=words)).capitalize()
+
+
+def power_law_weights(count, alpha=ALPHA):
+    '''Накопленные веса для random.choices(cum_weights=...).'''
+    return list(itertools.accumulate(
+        1 / (rank + 1) ** alpha for rank in range(count)))
+
+
+def _no_progress(label, done, total):
+    pass
+
+
+def bulk_create(model, objects, total, progress):
+    '''Пишет объекты пачками по BATCH_SIZE, каждую в своей транзакции.'''
+    done = 0
+    objects = iter(objects)
+    while True:
+        batch = list(itertools.islice(objects, BATCH_SIZE))
+        if not batch:
+            break
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        done += len(batch)
+        progress(model._meta.model_name, done, total)
+    return done
+
+
+def followed_authors(rng, author_ids, cum_weights, user_id, count):
+    '''`count` разных авторов для подписчика, популярные — чаще.'''
+    authors = set()
+    count = min(count, len(author_ids) - 1)
+    while len(authors) < count:
+        for author_id in rng.choices(
+                author_ids, cum_weights=cum_weights, k=count):
+            if author_id != user_id:
+                authors.add(author_id)
+    return sorted(authors)[:count]
+
+
+def mark_celebrities(after_follow_id):
+    '''Помечает знаменитостями авторов, у которых подписчиков больше
+    feeds.FANOUT_LIMIT: их посты не раскладываются по лентам.'''
+    author_ids = Follow.objects.filter(pk__gt=after_follow_id).values(
+        'author_id'
+    ).annotate(
+        followers=Count('pk')
+    ).filter(
+        followers__gt=feeds.FANOUT_LIMIT
+    ).values_list('author_id', flat=True)
+    Counter.objects.bulk_create(
+        [Counter(key=feeds.celebrity_key(author_id), value=0)
+         for author_id in author_ids],
+        ignore_conflicts=True
+    )
+
+
+def materialize_feeds(after_follow_id, progress=_no_progress):
+    '''Раскладывает посты по лентам подписок с id больше
+    `after_follow_id`, пачками по BATCH_SIZE подписок.'''
+    feed = FeedEntry._meta
+    follow = Follow._meta
+    post = Post._meta
+    counter = Counter._meta
+    last_follow_id = Follow.objects.aggregate(last=Max('pk'))['last'] or 0
+    total = last_follow_id - after_follow_id
+    for start in range(after_follow_id, last_follow_id, BATCH_SIZE):
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Ключ пометки — feeds.celebrity_key(author_id).
+            cursor.execute(
+                f'INSERT INTO {feed.db_table} (user_id, post_id, pub_date) '
+                f'SELECT f.user_id, p.id, p.pub_date '
+                f'FROM {follow.db_table} f '
+                f'JOIN {post.db_table} p ON p.author_id = f.author_id '
+                f'WHERE f.id > %s AND f.id <= %s AND NOT EXISTS ('
+                f'SELECT 1 FROM {counter.db_table} c '
+                f"WHERE c.key = 'author:' || f.author_id || ':celebrity')",
+                [start, start + BATCH_SIZE]
+            )
+        done = min(start + BATCH_SIZE, last_follow_id) - after_follow_id
+        progress(FeedEntry._meta.model_name, done, total)
+
+
+def bump_generations(prefix, groups):
+    '''Начинает новые поколения областей, которые затронул `seed`.'''
+    generations.bump(generations.INDEX)
+    generations.bump_batched(
+        generations.group_scope(f'{prefix}-group-{i}') for i in range(groups))
+    users = User.objects.filter(
+        username__startswith=f'{prefix}_user_'
+    ).values_list('pk', 'username')
+    generations.bump_batched(itertools.chain.from_iterable(
+        (generations.author_scope(username),
+         generations.follow_scope(user_id))
+        for user_id, username in users.iterator()
+    ))
+
+
+def seed(posts, users=None, groups=None, comments_per_post=1,
+         follows_per_user=FOLLOWS_PER_USER, seed=0, progress=None):
+    '''Создаёт `posts` постов вместе с авторами, группами, комментариями
+    и подписками. Возвращает число созданных строк по моделям.
+
+    `progress(label, done, total)` вызывается после каждой пачки.
+    '''
+    progress = progress or _no_progress
+    rng = random.Random(seed)
+    users = users or max(posts // POSTS_PER_USER, follows_per_user + 1)
+    groups = groups or max(posts // POSTS_PER_GROUP, 1)
+    comments = posts * comments_per_post
+    prefix = f'seed{seed}'
+    with explicit_dates():
+        bulk_create(User, (
+            User(username=f'{prefix}_user_{i}', first_name='Пользователь',
+                 last_name=str(i))
+            for i in range(users)
+        ), users, progress)
+        bulk_create(Group, (
+            Group(title=f'Группа {i}', slug=f'{prefix}-group-{i}',
+                  description=text(rng))
+            for i in range(groups)
+        ), groups, progress)
+        user_ids = list(User.objects.filter(
+            username__startswith=f'{prefix}_user_'
+        ).order_by('pk').values_list('pk', flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith=f'{prefix}-group-'
+        ).order_by('pk').values_list('pk', flat=True))
+        # Популярность перемешана, чтобы «звёзды» не шли подряд по id.
+        authors = user_ids[:]
+        rng.shuffle(authors)
+        cum_weights = power_law_weights(len(authors))
+        bulk_create(Post, (
+            Post(
+                author_id=rng.choices(authors, cum_weights=cum_weights)[0],
+                group_id=(None if rng.random() < NO_GROUP_SHARE
+                          else rng.choice(group_ids)),
+                text=text(rng, rng.randint(5, 40)),
+                pub_date=EPOCH - HISTORY * rng.random(),
+            )
+            for _ in range(posts)
+        ), posts, progress)
+        post_ids = list(Post.objects.filter(
+            author__username__startswith=f'{prefix}_user_'
+        ).order_by('pk').values_list('pk', flat=True))
+        bulk_create(Comment, (
+            Comment(
+                post_id=rng.choice(post_ids),
+                author_id=rng.choice(user_ids),
+                text=text(rng, rng.randint(3, 15)),
+                created=EPOCH - HISTORY * rng.random(),
+            )
+            for _ in range(comments)
+        ), comments, progress)
+    # Самые читаемые авторы — не обязательно самые плодовитые: иначе
+    # размер лент растёт как квадрат популярности.
+    followed = user_ids[:]
+    rng.shuffle(followed)
+    last_follow_id = Follow.objects.aggregate(last=Max('pk'))['last'] or 0
+    follows = bulk_create(Follow, (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in followed_authors(
+            rng, followed, cum_weights, user_id, follows_per_user)
+    ), users * follows_per_user, progress)
+    mark_celebrities(last_follow_id)
+    materialize_feeds(last_follow_id, progress)
+    bump_generations(prefix, groups)
+    counters.reset_total_posts()
+    return {
+        'users': users,
+        'groups': groups,
+        'posts': posts,
+        'comments': comments,
+        'follows': follows,
+    }
@@ -0,0 +1,264 @@
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+from sorl.thumbnail import delete as delete_image
+
+from . import counters, feeds, generations, id_lists, search
+from .models import Comment, Counter, Follow, Group, Post, User
+
+# Поля пользователя, которые видны в карточках его постов.
+AUTHOR_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_owners(sender, instance, **kwargs):
+    '''Запоминает автора, группу и картинку поста до редактирования.'''
+    instance._old_state = None
+    if instance.pk:
+        instance._old_state = Post.objects.filter(pk=instance.pk).values(
+            'author_id', 'group_id', 'author__username', 'group__slug',
+            'image'
+        ).first()
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change(counters.author_posts_key(instance.author_id), 1)
+        if instance.group_id:
+            counters.change(counters.group_posts_key(instance.group_id), 1)
+        counters.reset_total_posts()
+        feeds.fan_out(instance)
+        return
+    old_state = getattr(instance, '_old_state', None)
+    if old_state is None:
+        return
+    old_author_id = old_state['author_id']
+    old_group_id = old_state['group_id']
+    if old_author_id != instance.author_id:
+        counters.change(counters.author_posts_key(old_author_id), -1)
+        counters.change(counters.author_posts_key(instance.author_id), 1)
+    if old_group_id != instance.group_id:
+        if old_group_id:
+            counters.change(counters.group_posts_key(old_group_id), -1)
+        if instance.group_id:
+            counters.change(counters.group_posts_key(instance.group_id), 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change(counters.author_posts_key(instance.author_id), -1)
+    if instance.group_id:
+        counters.change(counters.group_posts_key(instance.group_id), -1)
+    Counter.objects.filter(
+        key=counters.post_comments_key(instance.pk)).delete()
+    counters.reset_total_posts()
+
+
+@receiver(post_delete, sender=Group)
+def drop_group_counter(sender, instance, **kwargs):
+    Counter.objects.filter(key=counters.group_posts_key(instance.pk)).delete()
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change(counters.post_comments_key(instance.post_id), 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change(counters.post_comments_key(instance.post_id), -1)
+
+
+@receiver(post_save, sender=Follow)
+def fill_feed_on_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change(
+            counters.author_followers_key(instance.author_id), 1)
+        feeds.mark_celebrity(instance.author)
+        feeds.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed_on_unfollow(sender, instance, **kwargs):
+    counters.change(counters.author_followers_key(instance.author_id), -1)
+    feeds.prune(instance.user, instance.author)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_generations(sender, instance, **kwargs):
+    scopes = generations.post_scopes(instance)
+    old_state = getattr(instance, '_old_state', None)
+    if old_state:
+        scopes.append(generations.author_scope(
+            old_state['author__username']))
+        if old_state['group__slug']:
+            scopes.append(generations.group_scope(old_state['group__slug']))
+    generations.bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_generations(sender, instance, **kwargs):
+    # Число комментариев выводится в лентах и в карточке поста
+    # (posts.cards), поэтому сдвигается updated_at и меняются все
+    # области поста: списки id лент (posts.id_lists) хранят updated_at.
+    # Если пост удаляется вместе с комментариями, области сменит его
+    # собственный сигнал.
+    Post.objects.filter(pk=instance.post_id).update(
+        updated_at=timezone.now())
+    try:
+        post = instance.post
+    except Post.DoesNotExist:
+        return
+    generations.bump(*generations.post_scopes(post))
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_names(sender, instance, **kwargs):
+    '''Запоминает slug и название группы до редактирования.'''
+    instance._old_names = None
+    if instance.pk:
+        instance._old_names = Group.objects.filter(
+            pk=instance.pk).values_list('slug', 'title').first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def bump_group_generations(sender, instance, created=False, **kwargs):
+    # Ссылка на группу (slug и название) есть в карточках её постов, в
+    # профилях их авторов и на страницах самих постов, поэтому при её
+    # смене у постов сдвигается updated_at и меняются все их области.
+    # При удалении это делается до того, как у постов обнулится
+    # group_id. Описание видно только на странице группы.
+    scopes = [generations.group_scope(instance.slug)]
+    old_names = getattr(instance, '_old_names', None)
+    if old_names and old_names[0] != instance.slug:
+        scopes.append(generations.group_scope(old_names[0]))
+    renamed = (
+        kwargs['signal'] is pre_delete
+        or old_names != (instance.slug, instance.title)
+    )
+    if created or not renamed:
+        generations.bump(*scopes)
+        return
+    posts = Post.objects.filter(group=instance).order_by()
+    posts.update(updated_at=timezone.now())
+    scopes.append(generations.INDEX)
+    scopes.extend(map(generations.author_scope, posts.values_list(
+        'author__username', flat=True).distinct()))
+    generations.bump(*scopes)
+    generations.bump_posts(posts.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_generation(sender, instance, **kwargs):
+    generations.bump(generations.follow_scope(instance.user_id))
+
+
+def release_image(name):
+    '''Удаляет картинку и её миниатюры после коммита, если на неё больше
+    не ссылаются посты (одинаковые картинки хранятся один раз).'''
+    if not name or Post.objects.filter(image=name).exists():
+        return
+    field = Post._meta.get_field('image')
+    try:
+        field.storage.path(name)
+    except SuspiciousFileOperation:
+        # Файл вне MEDIA_ROOT хранилищу не принадлежит.
+        return
+    image = field.attr_class(None, field, name)
+    released_at = time.time()
+
+    def delete():
+        # Пока транзакция шла, ту же картинку могли загрузить снова:
+        # ссылки проверяются ещё раз под блокировкой хранилища, а файл,
+        # который загрузка только что взяла, не удаляется, даже если
+        # её пост ещё не записан.
+        with field.storage.lock():
+            if (Post.objects.filter(image=name).exists()
+                    or field.storage.reused_since(name, released_at)):
+                return
+            delete_image(image)
+
+    transaction.on_commit(delete)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, created, **kwargs):
+    old_state = getattr(instance, '_old_state', None)
+    if old_state and old_state['image'] != instance.image.name:
+        release_image(old_state['image'])
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, **kwargs):
+    search.index_comment(instance)
+
+
+@receiver(pre_save, sender=User)
+def remember_user_name(sender, instance, update_fields=None, **kwargs):
+    '''Запоминает имя пользователя до редактирования. Вход на сайт
+    сохраняет только last_login и лишнего запроса не делает.'''
+    instance._old_name = None
+    if update_fields is not None and not set(update_fields) & set(
+            AUTHOR_NAME_FIELDS):
+        return
+    if instance.pk:
+        instance._old_name = User.objects.filter(
+            pk=instance.pk).values_list(*AUTHOR_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def touch_renamed_author_posts(sender, instance, **kwargs):
+    # Имя и ссылка на профиль автора выводятся в карточках его постов
+    # (posts.cards): посты получают новый updated_at, а все их области —
+    # новое поколение.
+    old_name = getattr(instance, '_old_name', None)
+    new_name = tuple(getattr(instance, name) for name in AUTHOR_NAME_FIELDS)
+    if old_name is None or tuple(old_name) == new_name:
+        return
+    posts = Post.objects.filter(author=instance).order_by()
+    posts.update(updated_at=timezone.now())
+    scopes = [
+        generations.INDEX,
+        generations.author_scope(old_name[0]),
+        generations.author_scope(instance.username),
+    ]
+    scopes.extend(map(generations.group_scope, posts.exclude(
+        group=None).values_list('group__slug', flat=True).distinct()))
+    generations.bump(*scopes)
+    generations.bump_posts(posts.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    # Посты в кеше объектов (posts.id_lists) меняют версию сами, через
+    # updated_at, а автор хранится одной записью на все свои посты.
+    cache.delete(id_lists.user_key(instance.pk))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def drop_cached_group(sender, instance, **kwargs):
+    cache.delete(id_lists.group_key(instance.pk))
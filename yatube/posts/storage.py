@@ -0,0 +1,70 @@
+import fcntl
+import hashlib
+import os
+import uuid
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+LOCK_NAME = '.lock'
+# Сколько секунд файл, который заново понадобился загрузке, не удаляется:
+# пост с ним ещё может быть не записан в базу.
+REUSE_GRACE: int = 10
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    '''Хранилище, где имя файла — хеш его содержимого.
+
+    Одинаковые картинки, загруженные разными пользователями, лежат на
+    диске один раз: posts/ab/cd/abcd….webp. Удалять файл можно, только
+    когда на него не ссылается ни один пост (см. posts.signals).
+    '''
+
+    @contextmanager
+    def lock(self):
+        '''Блокировка между процессами: проверка, что файл уже есть, при
+        загрузке и удаление файла не пересекаются.'''
+        os.makedirs(self.location, exist_ok=True)
+        with open(os.path.join(self.location, LOCK_NAME), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def reused_since(self, name, since):
+        '''Понадобился ли файл загрузке после `since` (или незадолго до
+        него). Вызывать под lock().'''
+        try:
+            modified = os.path.getmtime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return modified >= since - REUSE_GRACE
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        name = os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension)
+        with self.lock():
+            if self.exists(name):
+                # Отметка для удаления (reused_since): файл снова нужен.
+                os.utime(self.path(name))
+                return name
+        # Пишем под уникальным именем и атомарно переименовываем:
+        # параллельная загрузка того же файла просто перезапишет его
+        # тем же содержимым.
+        content.seek(0)
+        temporary_name = super()._save(
+            os.path.join(directory, 'tmp', uuid.uuid4().hex + extension),
+            content
+        )
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+        os.replace(self.path(temporary_name), self.path(name))
+        return name
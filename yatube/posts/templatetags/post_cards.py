@@ -0,0 +1,13 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts):
+    '''Карточки постов из кеша (posts.cards):
+    {% post_cards page_obj as cards %}{% for card in cards %}...'''
+    return [mark_safe(card) for card in render_cards(posts)]
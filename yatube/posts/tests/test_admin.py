@@ -0,0 +1,96 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import counters
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='')
+        cls.other_group = Group.objects.create(
+            title='Другая группа', slug='other', description='')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def create_rows(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create_user(username=f'author_{i}')
+            post = Post.objects.create(
+                author=author, text=f'Пост {i}', group=self.group)
+            Comment.objects.create(post=post, author=author, text='Коммент')
+            Follow.objects.create(user=self.admin, author=author)
+
+    def test_changelists_use_constant_number_of_queries(self):
+        urls = [
+            reverse('admin:posts_post_changelist'),
+            reverse('admin:posts_comment_changelist'),
+            reverse('admin:posts_follow_changelist'),
+        ]
+        self.create_rows(1)
+        expected = {}
+        for url in urls:
+            self.client.get(url)
+            expected[url] = self.count_queries(url)
+        self.create_rows(5)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), expected[url])
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(context.captured_queries)
+
+    def test_filtered_count_over_limit_is_exact_and_cached(self):
+        """Список длиннее COUNT_LIMIT показывает точное число строк, а
+        на следующих страницах берёт его из кеша."""
+        self.create_rows(3)
+        url = reverse('admin:posts_post_changelist')
+        params = {'group__id__exact': self.group.pk}
+        with mock.patch('posts.admin.COUNT_LIMIT', 2):
+            response = self.client.get(url, params)
+            self.assertEqual(response.context['cl'].result_count, 3)
+            self.create_rows(1)
+            response = self.client.get(url, params)
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_move_to_group_updates_counters(self):
+        self.create_rows(3)
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        self.assertEqual(counters.group_posts(self.group), 3)
+        self.assertEqual(counters.group_posts(self.other_group), 0)
+        self.client.post(reverse('admin:posts_post_changelist'), {
+            'action': 'move_to_group',
+            'group': self.other_group.pk,
+            '_selected_action': post_ids[:2],
+        })
+        self.assertEqual(
+            Post.objects.filter(group=self.other_group).count(), 2)
+        self.assertEqual(counters.group_posts(self.group), 1)
+        self.assertEqual(counters.group_posts(self.other_group), 2)
+        self.client.post(reverse('admin:posts_post_changelist'), {
+            'action': 'move_to_group',
+            'group': '',
+            '_selected_action': post_ids,
+        })
+        self.assertFalse(Post.objects.exclude(group=None).exists())
+        self.assertEqual(counters.group_posts(self.group), 0)
+        self.assertEqual(counters.group_posts(self.other_group), 0)
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.cards import card_key
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_card_is_rendered_once_for_all_feeds(self):
+        """Карточка, нарисованная для главной, берётся из кеша на
+        странице группы и в профиле."""
+        self.guest_client.get(reverse('posts:index'))
+        self.assertIsNotNone(cache.get(card_key(self.post)))
+        with mock.patch('posts.cards.get_template') as get_template:
+            for url in (
+                reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+                reverse('posts:profile', kwargs={'username': 'auth'}),
+            ):
+                self.assertContains(self.guest_client.get(url), 'Пост')
+        get_template.assert_not_called()
+
+    def test_comment_and_group_changes_refresh_card(self):
+        url = reverse('posts:index')
+        self.assertContains(self.guest_client.get(url), 'Комментариев: 0')
+        old_key = card_key(self.post)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        self.post.refresh_from_db()
+        self.assertNotEqual(card_key(self.post), old_key)
+        self.assertContains(self.guest_client.get(url), 'Комментариев: 1')
+        self.group.slug = 'new-slug'
+        self.group.save()
+        self.assertContains(
+            self.guest_client.get(url),
+            reverse('posts:group_list', kwargs={'slug': 'new-slug'})
+        )
+
+    def test_author_rename_refreshes_cards(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        old_key = card_key(self.post)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Лев'
+        author.last_name = 'Толстой'
+        author.save()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertNotEqual(card_key(post), old_key)
+        self.assertContains(self.guest_client.get(url), 'Лев Толстой')
+
+    def test_login_does_not_touch_posts(self):
+        old_key = card_key(Post.objects.get(pk=self.post.pk))
+        self.guest_client.force_login(self.author)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(card_key(post), old_key)
@@ -1,11 +1,17 @@
+import os
 import shutil
 import tempfile
+import time
+from io import BytesIO
+from unittest import mock
 
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from PIL import Image
 
+from posts import uploads
 from posts.forms import PostForm, CommentForm
 from posts.models import Post, Group, User, Comment
 
@@ -13,7 +19,7 @@ from posts.models import Post, Group, User, Comment
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAILS_ASYNC=False)
 class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -71,10 +77,114 @@ class PostCreateFormTests(TestCase):
             Post.objects.filter(
                 text=form_data['text'],
                 group=form_data['group'],
-                image='posts/small.gif'
+                image__startswith='posts/',
+                image__endswith=f'.{uploads.OUTPUT_EXTENSION}'
             ).exists()
         )
 
+    def test_identical_images_are_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом до удаления
+        последнего поста."""
+        buffer = BytesIO()
+        Image.new('RGB', (20, 20), 'red').save(buffer, 'PNG')
+        for text in ('Первый', 'Второй'):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={
+                    'text': text,
+                    'image': SimpleUploadedFile(
+                        f'{text}.png', buffer.getvalue(), 'image/png'),
+                }
+            )
+        first, second = Post.objects.filter(text__in=('Первый', 'Второй'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_thumbnail, second.image_thumbnail)
+        path = first.image.path
+        # Файл, только что взятый загрузкой, не удаляется
+        # (storage.REUSE_GRACE).
+        self.age_file(path)
+        with mock.patch(
+            'posts.signals.transaction.on_commit', side_effect=lambda f: f()
+        ):
+            first.delete()
+            self.assertTrue(os.path.exists(path))
+            second.delete()
+            self.assertFalse(os.path.exists(path))
+
+    def age_file(self, path):
+        old = time.time() - 60
+        os.utime(path, (old, old))
+
+    def test_image_reused_before_commit_is_kept(self):
+        """Картинку, которую снова загрузили, пока удалялся последний
+        пост с ней, удаление после коммита не трогает."""
+        buffer = BytesIO()
+        Image.new('RGB', (20, 20), 'blue').save(buffer, 'PNG')
+        image = SimpleUploadedFile('blue.png', buffer.getvalue(), 'image/png')
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=image)
+        path = post.image.path
+        self.age_file(path)
+        callbacks = []
+        with mock.patch(
+            'posts.signals.transaction.on_commit', side_effect=callbacks.append
+        ):
+            post.delete()
+        image.seek(0)
+        reused = Post._meta.get_field('image').storage.save(
+            'posts/blue.png', image)
+        self.assertEqual(reused, post.image.name)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(os.path.exists(path))
+
+    def test_post_create_rejects_huge_images(self):
+        """Картинки сверх лимитов байт и пикселей не принимаются."""
+        post_count = Post.objects.count()
+        cases = {
+            'big.png': (
+                (100, 100), mock.patch.object(uploads, 'MAX_UPLOAD_SIZE', 64)
+            ),
+            'wide.png': (
+                (3000, 100),
+                mock.patch.object(uploads, 'MAX_IMAGE_PIXELS', 100_000)
+            ),
+        }
+        for name, (size, limit) in cases.items():
+            with self.subTest(name=name), limit:
+                buffer = BytesIO()
+                Image.new('RGB', size).save(buffer, 'PNG')
+                response = self.authorized_client.post(
+                    reverse('posts:post_create'),
+                    data={
+                        'text': 'Тестовый текст',
+                        'image': SimpleUploadedFile(
+                            name, buffer.getvalue(), 'image/png'),
+                    }
+                )
+                self.assertTrue(response.context['form'].errors['image'])
+        self.assertEqual(Post.objects.count(), post_count)
+
+    def test_uploaded_image_is_reencoded(self):
+        """Картинка уменьшается и пересохраняется без метаданных."""
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010E] = 'описание'
+        Image.new('RGB', (4000, 1000)).save(buffer, 'JPEG', exif=exif)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Перекодированная картинка',
+                'image': SimpleUploadedFile(
+                    'photo.jpg', buffer.getvalue(), 'image/jpeg'),
+            }
+        )
+        post = Post.objects.get(text='Перекодированная картинка')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, uploads.OUTPUT_FORMAT)
+            self.assertEqual(image.size, (uploads.MAX_IMAGE_SIDE, 480))
+            self.assertFalse(image.getexif())
+
     def test_post_edit(self):
         """Валидная форма изменяет запись в post_edit."""
         post = Post.objects.create(
@@ -0,0 +1,113 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from posts import generations
+from posts.id_lists import feed_page, group_key, post_key, user_key
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class IdListCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def page(self, url='/', count=3):
+        return feed_page(
+            self.factory.get(url),
+            Post.objects.for_feed(),
+            [generations.INDEX],
+            count
+        )
+
+    def test_warm_page_needs_no_queries(self):
+        cold = self.page()
+        with self.assertNumQueries(0):
+            warm = self.page(count=lambda: self.fail('count не нужен'))
+        self.assertEqual(list(warm), list(cold))
+        self.assertEqual(warm[0].author, self.author)
+        self.assertEqual(warm[0].group, self.group)
+        self.assertEqual(warm.paginator.count, 3)
+
+    def test_missing_objects_are_loaded_in_one_query(self):
+        cold = self.page()
+        cache.delete(post_key(cold[0].pk, cold[0].updated_at))
+        cache.delete(user_key(self.author.pk))
+        with self.assertNumQueries(1):
+            warm = self.page()
+        self.assertEqual(list(warm), list(cold))
+        self.assertEqual(warm[2].author.username, 'auth')
+
+    def test_cursor_page_is_cached(self):
+        cold = self.page('/?cursor=')
+        with self.assertNumQueries(0):
+            warm = self.page('/?cursor=')
+        self.assertEqual(list(warm), list(cold))
+        self.assertFalse(warm.has_next())
+
+    def test_post_create_and_edit_refresh_feeds(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+        )
+        for url in urls:
+            self.client.get(url)
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Новый пост', 'group': self.group.pk}
+        )
+        post = Post.objects.latest('pk')
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'Исправленный пост', 'group': self.group.pk}
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.context['page_obj'][0], post)
+                self.assertContains(response, 'Исправленный пост')
+
+    def test_cached_objects_hold_only_displayed_fields(self):
+        self.page()
+        author = cache.get(user_key(self.author.pk))
+        self.assertEqual(author.get_full_name(), self.author.get_full_name())
+        self.assertNotIn('password', author.__dict__)
+        self.assertNotIn('email', author.__dict__)
+        group = cache.get(group_key(self.group.pk))
+        self.assertEqual(group.slug, 'test-slug')
+        self.assertNotIn('description', group.__dict__)
+
+    def test_comment_refreshes_author_feed(self):
+        """Комментарий сдвигает updated_at поста, и список id профиля
+        строится заново."""
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        self.assertContains(self.client.get(url), 'Комментариев: 0', 3)
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.posts[0].pk}),
+            {'text': 'Комментарий'}
+        )
+        self.assertContains(self.client.get(url), 'Комментариев: 1', 1)
+
+    def test_renamed_author_is_not_cached(self):
+        self.page()
+        self.author.first_name = 'Лев'
+        self.author.save()
+        self.assertEqual(self.page()[0].author.first_name, 'Лев')
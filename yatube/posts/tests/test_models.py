@@ -1,7 +1,12 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from .. import counters
+from ..management.commands.explain_feeds import FULL_SCAN_PATTERNS
+from ..models import Comment, Counter, Group, Post
 
 User = get_user_model()
 
@@ -30,3 +35,84 @@ class PostModelTest(TestCase):
         for field, expected_value in title_text.items():
             with self.subTest(field=field):
                 self.assertEqual(field, expected_value)
+
+
+class CounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Тестовое описание',
+        )
+
+    def test_counters_follow_post_changes(self):
+        """Счётчики постов и комментариев совпадают с COUNT(*)."""
+        self.assertEqual(counters.author_posts(self.user), 0)
+        self.assertEqual(counters.group_posts(self.group), 0)
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group)
+        Post.objects.create(author=self.user, text='Второй пост')
+        self.assertEqual(counters.author_posts(self.user), 2)
+        self.assertEqual(counters.group_posts(self.group), 1)
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(counters.group_posts(self.group), 0)
+        self.assertEqual(counters.group_posts(self.other_group), 1)
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        self.assertEqual(counters.post_comments(post), 1)
+        post.delete()
+        self.assertEqual(counters.author_posts(self.user), 1)
+        self.assertEqual(counters.group_posts(self.other_group), 0)
+
+    def test_counter_is_read_without_count_query(self):
+        counters.author_posts(self.user)
+        with self.assertNumQueries(1):
+            counters.author_posts(self.user)
+
+    def test_reconcile_fixes_drifted_counters(self):
+        """Команда reconcile_counters исправляет разошедшиеся счётчики и
+        не трогает пометки, которые счётчиками не являются."""
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        counters.author_posts(self.user)
+        counters.group_posts(self.group)
+        key = counters.author_posts_key(self.user.pk)
+        Counter.objects.filter(key=key).update(value=10)
+        Counter.objects.create(key=f'author:{self.user.pk}:celebrity')
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Исправлено счётчиков: 1', out.getvalue())
+        self.assertEqual(counters.author_posts(self.user), 1)
+        self.assertEqual(counters.group_posts(self.group), 1)
+
+    def test_feed_reads_comment_count_from_counter(self):
+        """В лентах число комментариев берётся из счётчика, а без
+        счётчика считается по комментариям."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        self.assertEqual(Post.objects.for_feed().get().comment_count, 1)
+        counters.post_comments(post)
+        Counter.objects.filter(
+            key=counters.post_comments_key(post.pk)).update(value=5)
+        self.assertEqual(Post.objects.for_feed().get().comment_count, 5)
+
+
+class FeedIndexesTest(TestCase):
+    def test_feed_queries_do_not_scan_tables(self):
+        """Запросы лент используют индексы."""
+        call_command('explain_feeds', stdout=StringIO())
+
+    def test_image_reference_check_uses_index(self):
+        """Проверка, ссылаются ли посты на картинку, идёт по индексу."""
+        plan = Post.objects.filter(image='posts/image.gif').explain()
+        self.assertFalse(
+            any(pattern.search(plan) for pattern in FULL_SCAN_PATTERNS),
+            plan
+        )
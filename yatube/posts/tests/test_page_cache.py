@@ -0,0 +1,150 @@
+import gzip
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import (
+    Client, RequestFactory, TestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import late_fragments
+from posts import page_cache
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(PAGE_CACHE=True)
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_second_request_is_served_from_cache(self):
+        """Повторный анонимный запрос не трогает базу и не рендерит
+        шаблон."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.guest_client.get(url)
+                self.assertEqual(second.status_code, 200)
+                self.assertTemplateNotUsed(second, 'base.html')
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_hits_and_misses_are_counted(self):
+        with mock.patch('posts.page_cache.metrics.record_cache') as record:
+            self.guest_client.get(self.urls[0])
+            self.assertEqual(record.call_args_list[0], mock.call(hit=False))
+            record.reset_mock()
+            self.guest_client.get(self.urls[0])
+            record.assert_called_once_with(hit=True)
+
+    def test_post_author_is_looked_up_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(self.urls[3])
+        lookups = [
+            query for query in queries
+            if query['sql'].startswith('SELECT "auth_user"."username"')
+        ]
+        self.assertEqual(len(lookups), 1)
+
+    def test_cached_page_is_sent_gzipped_with_fragments(self):
+        """Попадание отдаётся сжатым вместе с фрагментами пользователя."""
+        reader = User.objects.create_user(username='reader')
+        client = Client()
+        client.force_login(reader)
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        plain = client.get(url)
+        response = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertIn(
+            'Пользователь: reader', gzip.decompress(response.content).decode())
+
+    def test_entry_splices_fragments_between_compressed_chunks(self):
+        content = (
+            b'<!--late test a--><p>' + b'page ' * 1000
+            + b'</p><!--late test b--><!--late unknown c-->end'
+        )
+        entry = page_cache.make_entry({}, {}, content)
+        fragments = {'test': lambda request, arg: f'[{arg}]'}
+        with mock.patch.dict(late_fragments._registry, fragments):
+            zipped = page_cache.cached_response(
+                RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'),
+                entry, 'etag'
+            )
+            plain = page_cache.cached_response(
+                RequestFactory().get('/'), entry, 'etag')
+        expected = (
+            b'[a]<p>' + b'page ' * 1000
+            + b'</p>[b]<!--late unknown c-->end'
+        )
+        self.assertEqual(gzip.decompress(zipped.content), expected)
+        self.assertEqual(plain.content, expected)
+
+    def test_cached_page_answers_304(self):
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_changes_invalidate_pages(self):
+        """Новый пост, комментарий и правка группы сразу видны."""
+        for url in self.urls:
+            self.guest_client.get(url)
+        Post.objects.create(
+            author=self.author, group=self.group, text='Новый пост')
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertIsNotNone(self.guest_client.get(url).context)
+        detail = self.urls[3]
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Свежий комментарий')
+        self.assertContains(
+            self.guest_client.get(detail), 'Свежий комментарий')
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertContains(
+            self.guest_client.get(self.urls[1]), 'Новое название')
+
+    def test_page_is_shared_between_users(self):
+        """Вошедший пользователь получает общую страницу из кеша со своими
+        фрагментами."""
+        reader = User.objects.create_user(username='reader')
+        client = Client()
+        client.force_login(reader)
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        guest_response = self.guest_client.get(url)
+        self.assertNotContains(guest_response, 'Пользователь: reader')
+        response = client.get(url)
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'Подписаться')
+        self.assertNotEqual(response['ETag'], guest_response['ETag'])
+        Follow.objects.create(user=reader, author=self.author)
+        response = client.get(url)
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(response, 'Отписаться')
@@ -0,0 +1,95 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import counters, feeds, seeding
+from posts.management.commands.benchmark_views import percentile
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+
+User = get_user_model()
+
+
+class SeedingTest(TestCase):
+    def test_seed_creates_consistent_dataset(self):
+        dataset = seeding.seed(200, comments_per_post=2)
+        self.assertEqual(Post.objects.count(), dataset['posts'])
+        self.assertEqual(Comment.objects.count(), 400)
+        self.assertEqual(Follow.objects.count(), dataset['follows'])
+        follow = Follow.objects.first()
+        self.assertEqual(
+            FeedEntry.objects.filter(user=follow.user).count(),
+            Post.objects.filter(
+                author__following__user=follow.user).count()
+        )
+        author = Post.objects.first().author
+        self.assertEqual(
+            counters.author_posts(author), author.posts.count())
+
+    def test_seed_is_deterministic(self):
+        seeding.seed(50, seed=1)
+        first = list(Post.objects.order_by('pk').values_list(
+            'author__username', 'text', 'pub_date'))
+        Post.objects.all().delete()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        seeding.seed(50, seed=1)
+        second = list(Post.objects.order_by('pk').values_list(
+            'author__username', 'text', 'pub_date'))
+        self.assertEqual(first, second)
+
+    def test_seed_bumps_generations_instead_of_clearing_cache(self):
+        """Чужие ключи кеша остаются, а главная строится заново."""
+        cache.set('unrelated', 'value')
+        self.client.get(reverse('posts:index'))
+        seeding.seed(50)
+        self.assertEqual(cache.get('unrelated'), 'value')
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 50)
+
+
+class PercentileTest(TestCase):
+    def test_nearest_rank(self):
+        durations = list(range(1, 101))
+        self.assertEqual(percentile(durations, 50), 50)
+        self.assertEqual(percentile(durations, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+
+class SeedCommandTest(TestCase):
+    def test_command_seeds_and_refuses_same_seed_twice(self):
+        out = StringIO()
+        call_command('seed_yatube', posts=100, seed=3, stdout=out)
+        self.assertEqual(Post.objects.count(), 100)
+        self.assertIn('post: 100/100', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('seed_yatube', posts=100, seed=3, stdout=out)
+
+    def test_authors_follow_power_law(self):
+        seeding.seed(2000)
+        posts_per_author = sorted(
+            User.objects.annotate(
+                posts_count=Count('posts')
+            ).values_list('posts_count', flat=True),
+            reverse=True
+        )
+        top = sum(posts_per_author[:len(posts_per_author) // 10])
+        self.assertGreater(top, sum(posts_per_author) / 2)
+
+    def test_celebrities_are_not_fanned_out(self):
+        with mock.patch('posts.feeds.FANOUT_LIMIT', 3):
+            seeding.seed(300, follows_per_user=5)
+        celebrity_ids = [
+            author_id for author_id in User.objects.values_list(
+                'pk', flat=True)
+            if feeds.is_celebrity(author_id)
+        ]
+        self.assertTrue(celebrity_ids)
+        self.assertFalse(FeedEntry.objects.filter(
+            post__author_id__in=celebrity_ids).exists())
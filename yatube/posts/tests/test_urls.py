@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 
 from posts.models import Post, Group
@@ -7,6 +7,8 @@ from posts.models import Post, Group
 User = get_user_model()
 
 
+# Проверяются сами view; кеш страниц проверяет test_page_cache.
+@override_settings(PAGE_CACHE=False)
 class PostURLTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -1,15 +1,30 @@
+import base64
+import hashlib
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
 from django.urls import reverse
+from django.utils import timezone
 from django import forms
 
-from posts.models import Post, Group, Follow
+from posts import generations, thumbnails
+from posts.models import (
+    Post, Group, Follow, FeedEntry, Comment, SearchTerm
+)
+from posts.utils import COMMENTS_COUNT
 
 User = get_user_model()
 
 
+# Проверяются контекст и запросы самих view; кеш страниц проверяет
+# test_page_cache.
+@override_settings(PAGE_CACHE=False)
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -41,6 +56,7 @@ class PostPagesTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -95,6 +111,38 @@ class PostPagesTests(TestCase):
             reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
         self.assertEqual(response.context['post'], self.post)
 
+    def test_post_image_thumbnail_is_pregenerated(self):
+        """Миниатюра готовится заранее и выводится без sorl в шаблоне."""
+        call_command('generate_thumbnails', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.image_thumbnail)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.image_thumbnail)
+
+    def test_lost_thumbnail_jobs_are_left_to_command(self):
+        """Фоновый поток не перебирает посты без миниатюры при старте:
+        их готовит команда generate_thumbnails."""
+        Post.objects.filter(pk=self.post.pk).update(image_thumbnail='')
+        with mock.patch.object(thumbnails, '_queue') as queue:
+            queue.get.side_effect = SystemExit
+            with self.assertRaises(SystemExit):
+                thumbnails._work()
+        queue.put.assert_not_called()
+        call_command('generate_thumbnails', stdout=StringIO())
+        self.assertTrue(Post.objects.get(pk=self.post.pk).image_thumbnail)
+
+    def test_broken_image_is_not_retried(self):
+        """Картинка, которую не удалось уменьшить, выводится как есть и
+        больше не ждёт миниатюру."""
+        Post.objects.filter(pk=self.post.pk).update(image_thumbnail='')
+        with mock.patch.object(
+                thumbnails, 'get_thumbnail', side_effect=OSError), \
+                self.assertLogs('posts.thumbnails'):
+            thumbnails.generate(self.post.pk)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.image_thumbnail, post.image.url)
+        self.assertNotIn(post.pk, thumbnails.pending_post_ids())
+
     def test_post_edit_page_show_correct_context(self):
         """Шаблон create_post.html сформирован с правильным контекстом."""
         response = self.authorized_client.get(
@@ -156,10 +204,7 @@ class PostPagesTests(TestCase):
         '''Проверка кеша.'''
         first_content = self.authorized_client.get(
             reverse('posts:index')).content
-        Post.objects.create(
-            text='кеш',
-            author=self.user
-        )
+        Post.objects.filter(pk=self.post.pk).update(text='без сигналов')
         second_content = self.authorized_client.get(
             reverse('posts:index')).content
         self.assertEqual(first_content, second_content)
@@ -168,6 +213,65 @@ class PostPagesTests(TestCase):
             reverse('posts:index')).content
         self.assertNotEqual(first_content, third_content)
 
+    def test_cache_is_invalidated_by_changed_scope(self):
+        '''Новый пост сбрасывает кеш только своих страниц.'''
+        other_group = Group.objects.create(title='Другая', slug='other')
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:group_list', kwargs={'slug': other_group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        Post.objects.create(text='кеш', author=self.user, group=self.group)
+        for url in urls[:2] + urls[3:]:
+            with self.subTest(url=url):
+                self.assertContains(self.authorized_client.get(url), 'кеш')
+        # Список id чужой группы остался в кеше (posts.id_lists).
+        with self.assertNumQueries(3):
+            self.authorized_client.get(urls[2])
+
+    def test_group_rename_refreshes_pages_of_its_posts(self):
+        """После смены slug группы ленты с её постами ссылаются на новый
+        адрес."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        old_url = reverse('posts:group_list', kwargs={'slug': 'test_slug'})
+        self.group.slug = 'new_slug'
+        self.group.save()
+        new_url = reverse('posts:group_list', kwargs={'slug': 'new_slug'})
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, new_url)
+                self.assertNotContains(response, f'"{old_url}"')
+        self.group.slug = 'test_slug'
+        self.group.save()
+
+    def test_group_description_change_keeps_its_posts(self):
+        """Новое описание видно на странице группы, а посты группы и
+        их страницы не трогаются."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test_slug'})
+        self.authorized_client.get(url)
+        post_generation = generations.get_generation(
+            generations.post_scope(self.post.pk))
+        updated_at = Post.objects.get(pk=self.post.pk).updated_at
+        group = Group.objects.get(pk=self.group.pk)
+        group.description = 'Новое описание'
+        group.save()
+        self.assertContains(self.authorized_client.get(url), 'Новое описание')
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).updated_at, updated_at)
+        self.assertEqual(
+            generations.get_generation(generations.post_scope(self.post.pk)),
+            post_generation
+        )
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -220,6 +324,48 @@ class PaginatorViewsTest(TestCase):
                     kwargs={'username': self.user.username}) + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pages_index_contain_all_records(self):
+        """Курсорная пагинация проходит всю ленту без повторов."""
+        response = self.client.get(reverse('posts:index') + '?cursor=')
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertFalse(first_page.has_previous())
+        response = self.client.get(
+            reverse('posts:index') + '?cursor=' + first_page.next_cursor)
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        ids = [post.id for post in first_page] + [
+            post.id for post in second_page]
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True))
+        )
+        response = self.client.get(
+            reverse('posts:index') + '?cursor='
+            + second_page.previous_cursor)
+        self.assertEqual(list(response.context['page_obj']), list(first_page))
+
+    def test_invalid_cursor_returns_first_page(self):
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.user.username})
+            + '?cursor=broken')
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_cursor_with_huge_id_returns_first_page(self):
+        raw = 'n|2020-01-01T00:00:00+00:00|' + '9' * 30
+        cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+        response = self.client.get(
+            reverse('posts:index') + '?cursor=' + cursor)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(response, 'href="?cursor=">Первая')
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'comments': cursor}
+        )
+        self.assertEqual(response.status_code, 200)
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -269,3 +415,339 @@ class FollowViewsTest(TestCase):
             reverse('posts:follow_index')
         )
         self.assertNotIn(self.post, response.context['page_obj'])
+
+    def test_follow_feed_is_materialized(self):
+        """Посты автора раскладываются по лентам подписчиков."""
+        Follow.objects.create(user=self.subscriber, author=self.user)
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.subscriber, post=self.post).exists())
+        new_post = Post.objects.create(author=self.user, text='Новый пост')
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.subscriber, post=new_post).exists())
+        Follow.objects.filter(
+            user=self.subscriber, author=self.user).delete()
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.subscriber).exists())
+
+    def test_celebrity_posts_are_merged_on_read(self):
+        """Посты знаменитостей не рассылаются, но есть в ленте."""
+        with mock.patch('posts.feeds.FANOUT_LIMIT', 0):
+            Follow.objects.create(user=self.subscriber, author=self.user)
+            new_post = Post.objects.create(
+                author=self.user, text='Новый пост')
+        self.assertFalse(FeedEntry.objects.filter(post=new_post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post])
+
+    def test_celebrity_posts_are_ordered_with_feed_entries(self):
+        """Посты знаменитости и посты из ленты идут вперемешку по дате
+        публикации, без повторов."""
+        other_author = User.objects.create_user(username='other_author')
+        Follow.objects.create(user=self.subscriber, author=other_author)
+        Follow.objects.create(user=self.subscriber, author=self.user)
+        with mock.patch('posts.feeds.FANOUT_LIMIT', 0):
+            Follow.objects.create(
+                user=User.objects.create_user(username='fan'),
+                author=self.user
+            )
+        now = timezone.now()
+        posts = []
+        for days, author in ((3, self.user), (2, other_author),
+                             (1, self.user)):
+            post = Post.objects.create(author=author, text=f'Пост {days}')
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - timedelta(days=days))
+            FeedEntry.objects.filter(post=post).update(
+                pub_date=now - timedelta(days=days))
+            posts.append(post)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.post] + posts[::-1]
+        )
+
+    def test_follow_feed_changes_only_with_followed_authors(self):
+        """Пост чужого автора не сбрасывает ленту подписок, пост
+        избранного автора — сбрасывает."""
+        Follow.objects.create(user=self.subscriber, author=self.user)
+        url = reverse('posts:follow_index')
+        etag = self.authorized_client.get(url)['ETag']
+        other_author = User.objects.create_user(username='other_author')
+        Post.objects.create(author=other_author, text='Пост другого автора')
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.user, text='Свежий пост')
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Свежий пост')
+
+    def test_follow_feed_list_is_per_user(self):
+        """Пока список ленты одного читателя пересчитывается, другой
+        не получает его ленту."""
+        Follow.objects.create(user=self.subscriber, author=self.user)
+        other_author = User.objects.create_user(username='other_author')
+        Post.objects.create(author=other_author, text='Пост другого автора')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=other_author)
+        url = reverse('posts:follow_index')
+        self.authorized_client.get(url)
+        path = '%s|%s,%s' % (
+            url,
+            generations.author_scope('other_author'),
+            generations.follow_scope(reader.pk)
+        )
+        lock_key = 'ids:%s:lock' % hashlib.md5(path.encode()).hexdigest()
+        self.assertTrue(cache.add(lock_key, 1))
+        reader_client = Client()
+        reader_client.force_login(reader)
+        response = reader_client.get(url)
+        self.assertContains(response, 'Пост другого автора')
+        self.assertNotContains(response, 'Тестовый пост')
+
+
+@override_settings(PAGE_CACHE=False)
+class FeedQueryCountTest(TestCase):
+    """Число запросов на страницах не зависит от числа постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def create_posts(self, count):
+        """Посты разных авторов в общей группе, посты автора в разных
+        группах и комментарии разных пользователей."""
+        for i in range(count):
+            author = User.objects.create_user(username=f'author_{i}')
+            Follow.objects.create(user=self.reader, author=author)
+            Post.objects.create(author=author, text='Пост', group=self.group)
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'group_{i}', description='')
+            Post.objects.create(author=self.author, text='Пост', group=group)
+            Comment.objects.create(
+                post=self.post, author=author, text='Комментарий')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_feed_pages_use_constant_number_of_queries(self):
+        urls = {
+            reverse('posts:index'): 4,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 5,
+            reverse('posts:profile', kwargs={'username': 'author'}): 6,
+            # Плюс запрос авторов подписок для ETag и ключей кеша.
+            reverse('posts:follow_index'): 7,
+            # Плюс запрос автора поста для ETag (posts.conditional).
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}): 6,
+        }
+        for posts_count in (0, 10):
+            self.create_posts(posts_count)
+            for url in urls:
+                self.client.get(url)
+            cache.clear()
+            for url, queries in urls.items():
+                with self.subTest(url=url, posts_count=posts_count):
+                    with self.assertNumQueries(queries):
+                        self.client.get(url)
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.about_cats = Post.objects.create(
+            author=cls.author, text='Кошки, кошки и ещё раз кошки')
+        cls.about_dogs = Post.objects.create(
+            author=cls.author, text='Собаки и кошки')
+        cls.other = Post.objects.create(author=cls.author, text='Погода')
+
+    def setUp(self):
+        self.client = Client()
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+        return list(response.context['page_obj'])
+
+    def test_results_are_ranked_by_weight(self):
+        self.assertEqual(
+            self.search('КОШКИ'), [self.about_cats, self.about_dogs])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('кошки собаки'), [self.about_dogs])
+        self.assertEqual(self.search('кошки погода'), [])
+
+    def test_comments_are_indexed(self):
+        comment = Comment.objects.create(
+            post=self.other, author=self.reader, text='Дождь и ветер')
+        self.assertEqual(self.search('ветер'), [self.other])
+        comment.text = 'Солнце'
+        comment.save()
+        self.assertEqual(self.search('ветер'), [])
+        comment.delete()
+        self.assertEqual(self.search('солнце'), [])
+
+    def test_index_follows_post_changes(self):
+        self.other.text = 'Ясная погода'
+        self.other.save()
+        self.assertEqual(self.search('ясная'), [self.other])
+        self.other.delete()
+        self.assertEqual(self.search('погода'), [])
+
+    def test_pagination_keeps_query(self):
+        for _ in range(12):
+            Post.objects.create(author=self.author, text='Ёж')
+        self.assertEqual(len(self.search('еж')), 10)
+        self.assertEqual(len(self.search('еж', page=2)), 2)
+        response = self.client.get(reverse('posts:search'), {'q': 'еж'})
+        self.assertContains(response, '?q=%D0%B5%D0%B6&amp;page=2')
+
+    def test_empty_query_shows_form_only(self):
+        response = self.client.get(reverse('posts:search'))
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_rebuild_command_restores_index(self):
+        SearchTerm.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('собаки'), [self.about_dogs])
+
+
+class CommentThreadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for i in range(COMMENTS_COUNT + 5):
+            user = User.objects.create_user(username=f'commenter_{i}')
+            Comment.objects.create(
+                post=cls.post, author=user, text=f'Комментарий {i}')
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_post_detail_shows_first_slice(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_COUNT)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertTrue(comments.has_next())
+
+    def test_load_more_returns_next_slice(self):
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['comments']), COMMENTS_COUNT)
+        with self.assertNumQueries(2):
+            second = self.client.get(first['next']).json()
+        rest = range(COMMENTS_COUNT, COMMENTS_COUNT + 5)
+        self.assertEqual(
+            [comment['text'] for comment in second['comments']],
+            [f'Комментарий {i}' for i in rest]
+        )
+        self.assertEqual(
+            second['comments'][0]['author'], f'commenter_{COMMENTS_COUNT}')
+        self.assertIsNone(second['next'])
+
+    def test_load_more_for_missing_post(self):
+        url = reverse('posts:post_comments', kwargs={'post_id': 0})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_return_304(self):
+        """Неизменившиеся страницы отдаются ответом 304."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.revalidate(self.reader_client, url)
+                self.assertEqual(response.status_code, 304)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+
+    def test_304_skips_post_queries(self):
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_content(self):
+        """Новый пост, комментарий или подписка меняют ETag."""
+        index = reverse('posts:index')
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        profile = reverse('posts:profile', kwargs={'username': 'auth'})
+        etags = {
+            url: self.reader_client.get(url)['ETag']
+            for url in (index, detail, profile)
+        }
+        Post.objects.create(author=self.author, text='Новый пост')
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_group_rename_changes_post_etag(self):
+        """Страница поста показывает название группы, поэтому его смена
+        меняет ETag и для гостя, и для вошедшего пользователя."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etags = {
+            client: client.get(url)['ETag']
+            for client in (self.guest_client, self.reader_client)
+        }
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        for client, etag in etags.items():
+            with self.subTest(client=client):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, 'Новое название')
+
+    def test_etag_depends_on_user(self):
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.guest_client.get(url)['ETag'],
+            self.reader_client.get(url)['ETag']
+        )
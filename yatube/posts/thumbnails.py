@@ -0,0 +1,108 @@
+'''Миниатюры картинок постов, подготовленные заранее.
+
+Миниатюры считаются при загрузке картинки в фоновом потоке, а их
+адрес сохраняется в Post.image_thumbnail. Шаблоны выводят готовый
+адрес и не обращаются к хранилищу sorl-thumbnail на каждый пост.
+Очередь живёт в памяти процесса и пропадает при перезапуске: посты,
+оставшиеся без миниатюры, готовит команда generate_thumbnails. Если
+картинку не удалось уменьшить, в карточке выводится она сама, и пост
+больше не ждёт миниатюру — ни очередь, ни команда не повторяют ошибку
+(пересчитать всё можно через generate_thumbnails --all).
+'''
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from core import nplusone
+
+from . import generations
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Размер и параметры миниатюры карточки поста в шаблонах.
+CARD_GEOMETRY = '960x339'
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def generate(post_id):
+    '''Готовит миниатюру поста и сохраняет её адрес.'''
+    post = Post.objects.filter(pk=post_id).select_related(
+        'author', 'group').first()
+    if post is None or not post.image:
+        return
+    # Одинаковые картинки хранятся под одним именем, поэтому миниатюру
+    # можно взять у другого поста с той же картинкой.
+    url = Post.objects.filter(image=post.image.name).exclude(
+        image_thumbnail='').values_list('image_thumbnail', flat=True).first()
+    if url is None:
+        try:
+            # sorl-thumbnail сам повторяет запросы к своему хранилищу
+            # ключей; в фоне это не мешает, а в тестах миниатюра
+            # считается прямо в запросе.
+            with nplusone.ignore():
+                thumbnail = get_thumbnail(
+                    post.image, CARD_GEOMETRY, **CARD_OPTIONS)
+            url = thumbnail.url
+        except Exception:
+            logger.exception(
+                'Не удалось подготовить миниатюру поста %s', post_id)
+            url = post.image.url
+    # Картинку могли заменить, пока считалась миниатюра.
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        image_thumbnail=url, updated_at=timezone.now())
+    if updated:
+        generations.bump(*generations.post_scopes(post))
+
+
+def pending_post_ids():
+    '''id постов с картинкой, но без миниатюры.'''
+    return Post.objects.exclude(image='').filter(
+        image_thumbnail='').order_by('pk').values_list('pk', flat=True)
+
+
+def _work():
+    while True:
+        post_id = _queue.get()
+        try:
+            generate(post_id)
+        finally:
+            close_old_connections()
+            _queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_work, name='thumbnails', daemon=True)
+            _worker.start()
+
+
+def schedule(post):
+    '''Ставит пост в очередь на подготовку миниатюры.
+
+    В фоне миниатюра считается после коммита транзакции, когда пост уже
+    виден другим соединениям. При THUMBNAILS_ASYNC = False — сразу.
+    '''
+    if not post.image:
+        return
+    if not getattr(settings, 'THUMBNAILS_ASYNC', True):
+        generate(post.pk)
+        return
+
+    def enqueue():
+        _ensure_worker()
+        _queue.put(post.pk)
+
+    transaction.on_commit(enqueue)
@@ -0,0 +1,87 @@
+'''Загрузка картинок постов с ограничением памяти.
+
+Файл пишется на диск кусками, а всё, что сверх MAX_UPLOAD_SIZE, не
+сохраняется. Размер картинки проверяется по заголовку, без полного
+декодирования; принятая картинка перекодируется в компактный формат без
+метаданных и уменьшается до MAX_IMAGE_SIDE по большей стороне.
+'''
+import os
+import tempfile
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps, features
+
+MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS: int = 40_000_000
+MAX_IMAGE_SIDE: int = 1920
+
+if features.check('webp'):
+    OUTPUT_FORMAT, OUTPUT_EXTENSION = 'WEBP', 'webp'
+    OUTPUT_OPTIONS = {'quality': 82, 'method': 4}
+else:
+    OUTPUT_FORMAT, OUTPUT_EXTENSION = 'JPEG', 'jpg'
+    OUTPUT_OPTIONS = {'quality': 82, 'optimize': True, 'progressive': True}
+
+# Pillow откажется открывать картинку больше 2 × MAX_IMAGE_PIXELS ещё на
+# чтении заголовка (DecompressionBombError).
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    '''Пишет загрузку во временный файл и обрезает её на MAX_UPLOAD_SIZE.
+
+    Слишком большой файл помечается `too_large`, форма его отклоняет.
+    '''
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file.too_large = False
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > MAX_UPLOAD_SIZE:
+            self.file.too_large = True
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+
+def too_large(upload):
+    return getattr(upload, 'too_large', False)
+
+
+def too_many_pixels(upload):
+    '''Проверка по заголовку, который уже прочитал forms.ImageField.'''
+    width, height = upload.image.size
+    return width * height > MAX_IMAGE_PIXELS
+
+
+def reencode(upload):
+    '''Перекодирует картинку и возвращает новый загруженный файл.'''
+    upload.seek(0)
+    with Image.open(upload) as image:
+        # JPEG можно сразу декодировать в уменьшенном масштабе.
+        image.draft('RGB', (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+        has_alpha = image.mode in ('RGBA', 'LA') or (
+            image.mode == 'P' and 'transparency' in image.info)
+        if OUTPUT_FORMAT == 'WEBP' and has_alpha:
+            image = image.convert('RGBA')
+        else:
+            image = image.convert('RGB')
+        name = os.path.splitext(os.path.basename(upload.name))[0]
+        # Безымянный временный файл: хранилище копирует его кусками, а
+        # ОС удаляет при закрытии.
+        result = UploadedFile(
+            tempfile.TemporaryFile(),
+            f'{name}.{OUTPUT_EXTENSION}',
+            Image.MIME[OUTPUT_FORMAT]
+        )
+        # Метаданные (EXIF и пр.) не переносятся: сохраняются только
+        # пиксели.
+        image.save(result, OUTPUT_FORMAT, **OUTPUT_OPTIONS)
+    result.size = result.tell()
+    result.seek(0)
+    return result
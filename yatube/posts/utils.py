@@ -1,10 +1,158 @@
+import base64
+import binascii
+from collections.abc import Sequence
+
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
 COUNT: int = 10
+COMMENTS_COUNT: int = 20
+
+FEED_ORDERING = ('-pub_date', '-id')
+COMMENTS_ORDERING = ('created', 'id')
+# Наибольший id в базе (знаковое 64-битное целое).
+MAX_ID: int = 2 ** 63 - 1
+
+
+def paginate_comments(request, post):
+    '''Курсорная страница комментариев поста (`?comments=`), старые
+    первыми, вместе с авторами.'''
+    comments = post.comments.select_related('author').only(
+        'id', 'post', 'text', 'created', 'author__username')
+    paginator = CursorPaginator(comments, COMMENTS_COUNT, COMMENTS_ORDERING)
+    return paginator.get_page(request.GET.get('comments'))
+
+
+class CountedPaginator(Paginator):
+    '''Paginator, которому можно передать готовое число объектов.'''
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage(Sequence):
+    '''Страница курсорного пагинатора.'''
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, cursor, next_cursor,
+                 previous_cursor):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage %s>' % (self.cursor or 'first')
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    '''Пагинатор по ключу (keyset pagination).
+
+    `ordering` — два поля: значение сортировки и уникальный id, например
+    ('-pub_date', '-id') или ('created', 'id'). Курсор — непрозрачный
+    токен, в котором закодированы направление и ключ граничного объекта.
+    Время выборки не зависит от глубины страницы.
+    '''
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = self.ordering[0].startswith('-')
+
+    def encode_cursor(self, obj, direction):
+        value, pk = (getattr(obj, field) for field in self.fields)
+        raw = '%s|%s|%s' % (direction, value.isoformat(), pk)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+            direction, value, pk = raw.split('|')
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError,
+                OverflowError):
+            raise InvalidCursor(cursor)
+        if (direction not in ('n', 'p') or value is None
+                or not -MAX_ID - 1 <= pk <= MAX_ID):
+            raise InvalidCursor(cursor)
+        return direction, value, pk
+
+    def after(self, value, pk, forward=True):
+        # «Дальше» по сортировке: меньше для убывающего порядка. Условие
+        # записано как диапазон по первому полю, чтобы индекс
+        # (pub_date, id) отдавал строки уже отсортированными.
+        if self.descending == forward:
+            lookup, excluded = 'lte', 'gte'
+        else:
+            lookup, excluded = 'gte', 'lte'
+        field, pk_field = self.fields
+        return (
+            Q(**{'%s__%s' % (field, lookup): value})
+            & ~Q(**{field: value, '%s__%s' % (pk_field, excluded): pk})
+        )
+
+    def _reversed_ordering(self):
+        return [
+            name[1:] if name.startswith('-') else '-' + name
+            for name in self.ordering
+        ]
 
+    def page(self, cursor=None):
+        queryset = self.object_list
+        direction = 'n'
+        if cursor:
+            direction, value, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                self.after(value, pk, forward=direction == 'n'))
+        if direction == 'n':
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            queryset = queryset.order_by(*self._reversed_ordering())
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'p':
+            rows.reverse()
+        has_next = has_more if direction == 'n' else bool(cursor)
+        has_previous = bool(cursor) if direction == 'n' else has_more
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(rows[-1], 'n')
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(rows[0], 'p')
+        return CursorPage(rows, self, cursor, next_cursor, previous_cursor)
 
-def paginate(request, data_list):
-    '''Пагинатор постов.'''
-    paginator = Paginator(data_list, COUNT)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    def get_page(self, cursor=None):
+        '''Как Paginator.get_page: битый курсор отдаёт первую страницу.'''
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page(None)
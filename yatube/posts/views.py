@@ -1,65 +1,114 @@
+from urllib.parse import urlencode
+
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
+from django.urls import reverse
 
+from . import counters, feeds, generations, id_lists, search, thumbnails
+from .conditional import (
+    conditional, follow_etag, followed_author_scopes, group_etag, index_etag,
+    post_etag, profile_etag
+)
 from .forms import PostForm, CommentForm
 from .models import Post, Group, User, Follow
-from .utils import paginate
+from .utils import COUNT, CountedPaginator, paginate_comments
 
 
+@conditional(index_etag)
 def index(request):
     '''View-функция для главной страницы.'''
-    post_list = Post.objects.all()
-    page_obj = paginate(request, post_list)
-    context = {'page_obj': page_obj}
+    post_list = Post.objects.for_feed()
+    page_obj = id_lists.feed_page(
+        request, post_list, [generations.INDEX], counters.total_posts)
+    context = {
+        'page_obj': page_obj,
+    }
     return render(request, 'posts/index.html', context)
 
 
+@conditional(group_etag)
 def group_posts(request, slug):
     '''View-функция для страницы, на которой будут посты.'''
     group = get_object_or_404(Group, slug=slug)
-    group_list = group.posts.all()
-    page_obj = paginate(request, group_list)
+    group_list = group.posts.for_feed()
+    page_obj = id_lists.feed_page(
+        request,
+        group_list,
+        [generations.group_scope(group.slug)],
+        lambda: counters.group_posts(group)
+    )
     context = {
         'group': group,
-        'page_obj': page_obj
+        'page_obj': page_obj,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional(profile_etag)
 def profile(request, username):
     '''View-функция для страницы, на которой будет профайл пользователя.'''
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    page_obj = paginate(request, post_list)
-    following = False
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            author=author,
-            user=request.user
-        ).exists()
+    post_list = author.posts.for_feed()
+    posts_count = counters.author_posts(author)
+    page_obj = id_lists.feed_page(
+        request,
+        post_list,
+        [generations.author_scope(author.username)],
+        posts_count
+    )
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following
+        'posts_count': posts_count,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional(post_etag)
 def post_detail(request, post_id):
     '''View-функция для просмотра поста.'''
     post = get_object_or_404(
         Post.objects.select_related('author', 'group'), id=post_id)
-    comments = post.comments.all()
+    comments = paginate_comments(request, post)
+    # Саму форму выводит фрагмент comment_form (posts.fragments).
     form = CommentForm()
     context = {
         'post': post,
+        'author_posts_count': counters.author_posts(post.author),
         'comments': comments,
         'form': form
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    '''JSON со следующей порцией комментариев поста («показать ещё»).'''
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    comments = paginate_comments(request, post)
+    next_url = None
+    if comments.has_next():
+        next_url = '%s?%s' % (
+            reverse('posts:post_comments', args=(post.pk,)),
+            urlencode({'comments': comments.next_cursor})
+        )
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.pk,
+                'author': comment.author.username,
+                'author_url': reverse(
+                    'posts:profile', args=(comment.author.username,)),
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+            }
+            for comment in comments
+        ],
+        'next': next_url,
+    })
+
+
 @login_required
 def post_create(request):
     '''View-функция для создания поста.'''
@@ -71,6 +120,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect('posts:profile', username=request.user)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -87,7 +137,12 @@ def post_edit(request, post_id):
     template = 'posts/create_post.html'
     if post.author == request.user:
         if form.is_valid():
-            form.save()
+            post = form.save(commit=False)
+            if 'image' in form.changed_data:
+                post.image_thumbnail = ''
+            post.save()
+            if 'image' in form.changed_data:
+                thumbnails.schedule(post)
             return redirect('posts:post_detail', post_id)
     else:
         return redirect('posts:post_detail', post_id)
@@ -108,11 +163,21 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional(follow_etag)
 def follow_index(request):
     '''View-функция для страниц избранных авторов.'''
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginate(request, post_list)
-    context = {'page_obj': page_obj}
+    scopes = [
+        *followed_author_scopes(request),
+        generations.follow_scope(request.user.pk),
+    ]
+    page_obj = id_lists.feed_page(
+        request,
+        lambda: feeds.timeline(request.user).for_feed(),
+        scopes
+    )
+    context = {
+        'page_obj': page_obj,
+    }
     return render(request, 'posts/follow.html', context)
 
 
@@ -131,3 +196,25 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', author)
+
+
+def post_search(request):
+    '''View-функция для поиска по постам и комментариям.'''
+    query = request.GET.get('q', '').strip()
+    terms = search.parse_query(query)
+    page_obj = None
+    if terms:
+        paginator = CountedPaginator(search.ranked_posts(terms), COUNT)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        posts = Post.objects.for_feed().in_bulk(
+            [row['post_id'] for row in page_obj])
+        page_obj.object_list = [
+            posts[row['post_id']] for row in page_obj
+            if row['post_id'] in posts
+        ]
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +59,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Фрагменты подставляются в ответ, в том числе взятый из кеша.
+    'core.middleware.LateFragmentsMiddleware',
+    'posts.page_cache.PageCacheMiddleware',
+    'core.middleware.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -64,7 +70,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backend.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,9 +95,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами одного потока.
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 600)),
     }
 }
 
+# Реплики только для чтения: пути к копиям базы SQLite через запятую в
+# SQLITE_REPLICAS. Копии обновляет `manage.py sync_replicas`.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.getenv('SQLITE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи чтения пользователя идут в основную базу.
+PRIMARY_PIN_SECONDS = int(os.getenv('PRIMARY_PIN_SECONDS', 10))
+
+# Применяются к каждому новому соединению с SQLite (core.sqlite).
+# WAL позволяет читать во время записи, а busy_timeout заставляет
+# писателя подождать блокировку вместо «database is locked».
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -147,8 +182,77 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки пишутся на диск кусками, в памяти не держится больше чанка.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.BoundedUploadHandler']
+
+# Кеш по умолчанию живёт в памяти процесса. Чтобы воркеры делили
+# один кеш, задайте общий бэкенд, например:
+# CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# CACHE_LOCATION=/var/tmp/yatube_cache
+# или django.core.cache.backends.memcached.MemcachedCache и 127.0.0.1:11211.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
+
+# Миниатюры картинок постов считаются в фоновом потоке (0 — сразу, в
+# запросе).
+THUMBNAILS_ASYNC = os.getenv('THUMBNAILS_ASYNC', '1') == '1'
+
+# Кеш целых страниц (posts.page_cache).
+PAGE_CACHE = os.getenv('PAGE_CACHE', '1') == '1'
+
+# Адреса, которым открыт /metrics (Prometheus).
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Журнал медленных SQL-запросов (core.slow_queries). None — выключен;
+# в окружении — пустое значение или off.
+SLOW_QUERY_THRESHOLD_MS = os.getenv('SLOW_QUERY_THRESHOLD_MS', '100')
+SLOW_QUERY_THRESHOLD_MS = (
+    None if SLOW_QUERY_THRESHOLD_MS.strip().lower() in ('', 'off')
+    else float(SLOW_QUERY_THRESHOLD_MS)
+)
+SLOW_QUERY_REDACT_PARAMS = os.getenv('SLOW_QUERY_REDACT_PARAMS', '1') == '1'
+SLOW_QUERY_LOG = os.getenv(
+    'SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'slow_queries.log'))
+
+# Поиск N+1 (core.nplusone): форма SQL, повторённая за запрос больше
+# NPLUSONE_THRESHOLD раз. Режимы: 'warn', 'raise' и 'off'.
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+NPLUSONE_MODE = os.getenv('NPLUSONE_MODE', 'warn')
+# Режим в тестах: и manage.py test (core.test_runner), и pytest
+# (conftest.py).
+NPLUSONE_TEST_MODE = os.getenv('NPLUSONE_TEST_MODE', 'raise')
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -18,6 +18,8 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import metrics_view
+
 
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
@@ -29,6 +31,7 @@ urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
     path('profile/', include('posts.urls', namespace='posts')),
     path('posts/', include('posts.urls', namespace='posts')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 if settings.DEBUG:
     urlpatterns += static(